@@ -0,0 +1,88 @@
+import os
+import threading
+from dataclasses import dataclass, fields
+
+import numpy as np
+
+
+class SignalHandle:
+    """信号数组的延迟加载句柄
+
+    数组保存在.npz文件中时只记录路径, 调用load()时才读取;
+    没有文件时直接持有数组(例如未启用缓存的单次分析)。
+    """
+
+    __slots__ = ("path", "_arrays")
+
+    def __init__(self, path=None, arrays=None):
+        if path is None and arrays is None:
+            raise ValueError("path和arrays至少需要一个")
+        self.path = path
+        self._arrays = arrays
+
+    @classmethod
+    def save(cls, path, **arrays):
+        """把数组写入.npz文件, 返回指向该文件的句柄
+
+        临时文件名包含进程和线程编号, 同一条目的并发写入互不干扰。
+        """
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+        return cls(path=path)
+
+    def load(self):
+        """读取信号数组, 返回{名称: 数组}"""
+        if self._arrays is not None:
+            return self._arrays
+        with np.load(self.path) as npz:
+            return {name: npz[name] for name in npz.files}
+
+    def __getstate__(self):
+        # 有文件时只序列化路径, 数组不随结果传递
+        return (self.path, None if self.path else self._arrays)
+
+    def __setstate__(self, state):
+        self.path, self._arrays = state
+
+
+@dataclass(slots=True)
+class AnalysisResult:
+    """单个文件的分析结果, 只包含摘要指标
+
+    原始信号、处理后信号和R峰位置通过signals句柄按需加载。
+    """
+
+    file_name: str
+    record_date: str
+    classification: str
+    sampling_rate: float
+    duration: float
+    total_beats: int
+    heart_rate_stats: dict
+    hrv_metrics: dict
+    arrhythmia_warnings: list
+    beat_counts: dict = None
+    trend_analysis: dict = None
+    plot_name: str = None
+    health_evaluation: dict = None
+    anomaly: dict = None
+    signals: SignalHandle = None
+
+    def load_signals(self):
+        """读取信号数组: raw_data, processed_data, peaks, beat_labels"""
+        if self.signals is None:
+            raise ValueError(f"{self.file_name} 没有保存信号数据")
+        return self.signals.load()
+
+    def to_dict(self):
+        """摘要指标字典(不含信号句柄), 可直接JSON序列化"""
+        return {
+            f.name: getattr(self, f.name) for f in fields(self) if f.name != "signals"
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """由to_dict()的结果构造, 忽略未知的键"""
+        names = {f.name for f in fields(cls)} - {"signals"}
+        return cls(**{k: v for k, v in data.items() if k in names})
@@ -0,0 +1,86 @@
+import math
+
+# 参与检测的指标: (AnalysisResult字段, 键)
+FEATURES = (
+    ("heart_rate_stats", "mean_hr"),
+    ("heart_rate_stats", "std_hr"),
+    ("hrv_metrics", "sdnn"),
+    ("hrv_metrics", "rmssd"),
+)
+
+
+class StreamingAnomalyDetector:
+    """逐条记录更新的异常检测器(EWMA控制限)
+
+    每个指标维护指数加权的均值和方差, 新记录与更新前的均值相差超过threshold个
+    标准差时标记为异常, 每次更新的时间和内存都是O(1)。
+    前warmup条记录用精确的均值和方差(Welford)初始化, 期间不报警;
+    之后超出控制限的值先截断到控制限再更新, 单个异常值不会拉偏基线。
+    """
+
+    def __init__(self, alpha=0.1, threshold=3.0, warmup=5):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.count = 0
+        self.mean = {}
+        self.var = {}
+
+    def _update_metric(self, name, x):
+        """更新单个指标, 返回更新前的z分数(预热期间为None)"""
+        if self.count < self.warmup:
+            # Welford算法: 预热期间的精确均值和总体方差
+            mean = self.mean.get(name, 0.0)
+            delta = x - mean
+            mean += delta / (self.count + 1)
+            m2 = self.var.get(name, 0.0) * self.count + delta * (x - mean)
+            self.mean[name] = mean
+            self.var[name] = m2 / (self.count + 1)
+            return None
+
+        mean = self.mean[name]
+        std = math.sqrt(self.var[name])
+        z = (x - mean) / std if std > 0 else 0.0
+        if std > 0:
+            x = min(max(x, mean - self.threshold * std), mean + self.threshold * std)
+
+        diff = x - mean
+        increment = self.alpha * diff
+        self.mean[name] = mean + increment
+        self.var[name] = (1 - self.alpha) * (self.var[name] + diff * increment)
+        return z
+
+    def update(self, result):
+        """用一条分析结果(AnalysisResult)更新状态
+
+        返回{"flagged": 是否异常, "metrics": 超出控制限的指标, "scores": 各指标z分数}。
+        """
+        scores = {}
+        for field, key in FEATURES:
+            z = self._update_metric(key, float(getattr(result, field)[key]))
+            if z is not None:
+                scores[key] = z
+        self.count += 1
+
+        flagged = [key for key, z in scores.items() if abs(z) > self.threshold]
+        return {"flagged": bool(flagged), "metrics": flagged, "scores": scores}
+
+    def to_dict(self):
+        """可JSON序列化的状态"""
+        return {
+            "alpha": self.alpha,
+            "threshold": self.threshold,
+            "warmup": self.warmup,
+            "count": self.count,
+            "mean": self.mean,
+            "var": self.var,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        """由to_dict()的结果恢复"""
+        detector = cls(state["alpha"], state["threshold"], state["warmup"])
+        detector.count = state["count"]
+        detector.mean = dict(state["mean"])
+        detector.var = dict(state["var"])
+        return detector
@@ -0,0 +1,271 @@
+"""不启动Web服务的批量ECG分析
+
+按通配符选择记录, 每条记录分析完成后立即把摘要指标写入输出文件。示例:
+
+    python batch_analyze.py "archive/**/*.csv" --workers 8 --output nightly.jsonl
+    python batch_analyze.py data/*.csv --format parquet --output nightly.parquet --plots
+
+parquet格式需要可选依赖pyarrow(见requirements.txt)。
+
+默认不绘图, 此时不会导入matplotlib。分析结果缓存在--cache-dir中; 是否绘图是缓存键的
+一部分, 与Web服务使用同一目录且指定--plots时两者才共享分析结果。多进程时记录按完成顺序写出。
+批量分析不写入指标存储, 在线异常标记在Web服务的比较分析中补齐。
+有记录分析失败时返回非0。
+"""
+
+import argparse
+import contextlib
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from batch_metrics import EXTENDED_HRV_KEYS
+from beat_classifier import LABEL_NAMES
+
+# Parquet的行组大小: 攒够这么多条记录写出一个行组
+PARQUET_ROW_GROUP = 100
+
+# Parquet的列及其类型, 与summary_record的键一致; 类型不从数据推断,
+# 短记录中为None的指标列在后续行组中有值时类型不会冲突
+PARQUET_COLUMNS = (
+    ("file_name", "string"),
+    ("file_path", "string"),
+    ("record_date", "string"),
+    ("classification", "string"),
+    ("sampling_rate", "float64"),
+    ("duration", "float64"),
+    ("total_beats", "int64"),
+    *((f"{name}_beats", "int64") for name in LABEL_NAMES.values()),
+    *(
+        (key, "float64")
+        for key in ("mean_hr", "min_hr", "max_hr", "std_hr", "sdnn", "rmssd", "pnn50")
+    ),
+    *((key, "float64") for key in EXTENDED_HRV_KEYS),
+    ("arrhythmia_warnings", "list<string>"),
+    ("trend", "string"),
+    ("health_score", "int64"),
+    ("health_level", "string"),
+    ("health_warnings", "list<string>"),
+    ("plot", "string"),
+    ("error", "string"),
+)
+
+
+def find_inputs(patterns):
+    """展开通配符(支持**), 返回去重排序后的文件路径"""
+    paths = set()
+    for pattern in patterns:
+        paths.update(p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p))
+    return sorted(paths)
+
+
+def summary_record(file_path, result, plot_dir=None):
+    """把分析结果整理为一行扁平的记录, 分析失败时result为None"""
+    record = {"file_name": os.path.basename(file_path), "file_path": file_path}
+    if result is None:
+        record["error"] = "分析失败"
+        return record
+
+    health = result.health_evaluation or {}
+    record.update(
+        {
+            "record_date": result.record_date,
+            "classification": result.classification,
+            "sampling_rate": float(result.sampling_rate),
+            "duration": float(result.duration),
+            "total_beats": int(result.total_beats),
+            **{f"{name}_beats": count for name, count in (result.beat_counts or {}).items()},
+            **{k: float(v) for k, v in result.heart_rate_stats.items()},
+            **{
+                k: float(v) if v is not None else None
+                for k, v in result.hrv_metrics.items()
+            },
+            "arrhythmia_warnings": list(result.arrhythmia_warnings),
+            "trend": (
+                result.trend_analysis["trend_description"]
+                if result.trend_analysis
+                else None
+            ),
+            "health_score": health.get("score"),
+            "health_level": health.get("level"),
+            "health_warnings": list(health.get("warnings", [])),
+            "plot": (
+                os.path.join(plot_dir, result.plot_name)
+                if plot_dir and result.plot_name
+                else None
+            ),
+            "error": None,
+        }
+    )
+    return record
+
+
+def _init_worker(plot_dir):
+    """工作进程初始化: 按是否绘图设置全局分析器的图像存储"""
+    import main
+    from plot_store import PlotStore
+
+    main.analyzer.plot_store = PlotStore(plot_dir) if plot_dir else None
+
+
+def analyze_record(file_path, plot_dir=None):
+    """分析单个文件并附加健康评估, 返回摘要记录"""
+    import main
+
+    try:
+        # 分析过程的提示输出到标准错误, 标准输出只用于JSON Lines结果
+        with contextlib.redirect_stdout(sys.stderr):
+            result = main.analyzer.analyze_file(file_path)
+        if result is not None:
+            result.health_evaluation = main.analyzer.evaluate_health_status(result)
+    except Exception as e:  # 单个文件出错不影响整批
+        print(f"分析文件 {file_path} 时出错: {str(e)}", file=sys.stderr)
+        result = None
+    return summary_record(file_path, result, plot_dir)
+
+
+def iter_records(file_paths, workers, plot_dir=None):
+    """逐个产出分析记录, 多进程时按完成顺序"""
+    _init_worker(plot_dir)
+    if workers <= 1:
+        for file_path in file_paths:
+            yield analyze_record(file_path, plot_dir)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(plot_dir,)
+    ) as pool:
+        futures = [pool.submit(analyze_record, p, plot_dir) for p in file_paths]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+class JsonLinesWriter:
+    """每条记录写一行JSON并立即刷新"""
+
+    def __init__(self, path):
+        self._file = open(path, "w", encoding="utf-8") if path != "-" else sys.stdout
+
+    def write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+
+class ParquetWriter:
+    """按行组写出Parquet文件, 需要可选依赖pyarrow
+
+    表结构固定为PARQUET_COLUMNS, 记录中缺少的列写为空值。
+    """
+
+    def __init__(self, path, row_group=PARQUET_ROW_GROUP):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        types = {
+            "string": pa.string(),
+            "float64": pa.float64(),
+            "int64": pa.int64(),
+            "list<string>": pa.list_(pa.string()),
+        }
+        self._pa = pa
+        self.schema = pa.schema([(name, types[kind]) for name, kind in PARQUET_COLUMNS])
+        self.path = path
+        self.row_group = row_group
+        self._rows = []
+        self._writer = pq.ParquetWriter(path, self.schema)
+
+    def _flush(self):
+        if not self._rows:
+            return
+        table = self._pa.Table.from_pylist(self._rows, schema=self.schema)
+        self._writer.write_table(table)
+        self._rows = []
+
+    def write(self, record):
+        self._rows.append(record)
+        if len(self._rows) >= self.row_group:
+            self._flush()
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量分析ECG记录, 不启动Web服务")
+    parser.add_argument(
+        "inputs", nargs="*", help="输入文件通配符, 支持**; 默认分析数据目录下的所有CSV"
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="分析进程数")
+    parser.add_argument(
+        "--format", choices=("jsonl", "parquet"), default="jsonl", help="输出格式"
+    )
+    parser.add_argument("--output", default="-", help="输出文件, jsonl格式默认输出到标准输出")
+    parser.add_argument("--plots", action="store_true", help="同时绘制并保存分析图")
+    parser.add_argument("--plot-dir", help="分析图目录, 默认为结果目录下的plots")
+    parser.add_argument("--data-dir", help="数据目录, 未指定inputs时使用")
+    parser.add_argument("--results-dir", help="结果目录")
+    parser.add_argument("--cache-dir", help="分析结果缓存目录")
+    args = parser.parse_args()
+
+    if args.format == "parquet":
+        if args.output == "-":
+            parser.error("parquet格式需要指定--output文件")
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error("parquet格式需要安装可选依赖pyarrow(pip install pyarrow)")
+
+    # main在导入时按这些目录创建缓存和存储, 必须在导入前设置
+    for option, variable in (
+        (args.data_dir, "ECG_DATA_DIR"),
+        (args.results_dir, "ECG_RESULTS_DIR"),
+        (args.cache_dir, "ECG_CACHE_DIR"),
+    ):
+        if option:
+            os.environ[variable] = os.path.abspath(option)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    import main as ecg_app
+
+    patterns = args.inputs or [os.path.join(ecg_app.DATA_DIR, "*.csv")]
+    file_paths = find_inputs(patterns)
+    if not file_paths:
+        parser.error("没有找到匹配的输入文件")
+    plot_dir = (args.plot_dir or ecg_app.PLOTS_DIR) if args.plots else None
+    workers = max(1, min(args.workers, len(file_paths)))
+
+    writer = (
+        ParquetWriter(args.output)
+        if args.format == "parquet"
+        else JsonLinesWriter(args.output)
+    )
+    start = time.perf_counter()
+    failed = 0
+    try:
+        records = iter_records(file_paths, workers, plot_dir)
+        for done, record in enumerate(records, 1):
+            writer.write(record)
+            failed += record["error"] is not None
+            print(f"[{done}/{len(file_paths)}] {record['file_name']}", file=sys.stderr)
+    finally:
+        writer.close()
+
+    print(
+        f"完成 {len(file_paths)} 个文件, 失败 {failed} 个, "
+        f"耗时 {time.perf_counter() - start:.1f}秒",
+        file=sys.stderr,
+    )
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
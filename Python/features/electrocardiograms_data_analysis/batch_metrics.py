@@ -0,0 +1,175 @@
+import numpy as np
+
+from hrv import extended_hrv_metrics
+
+# 与ECGAnalyzer.detect_arrhythmia相同的判断顺序和提示
+ARRHYTHMIA_MESSAGES = (
+    ("tachycardia", "可能存在心动过速"),
+    ("bradycardia", "可能存在心动过缓"),
+    ("irregular", "可能存在心率不齐"),
+)
+
+# extended=True时额外计算的HRV指标
+EXTENDED_HRV_KEYS = (
+    "lf_power",
+    "hf_power",
+    "lf_hf_ratio",
+    "sd1",
+    "sd2",
+    "sample_entropy",
+)
+
+
+def ragged_from_arrays(arrays):
+    """把多个R峰数组拼接为(扁平数组, 偏移量)
+
+    偏移量长度为记录数+1, 第i个记录为values[offsets[i]:offsets[i + 1]]。
+    """
+    lengths = [len(a) for a in arrays]
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    if not arrays or offsets[-1] == 0:
+        return np.empty(0, dtype=np.float64), offsets
+    values = np.concatenate([np.asarray(a, dtype=np.float64) for a in arrays])
+    return values, offsets
+
+
+def batch_rr_intervals(values, offsets, sampling_rates):
+    """一次计算所有记录的RR间期(ms), 返回(RR间期, 所属记录编号)
+
+    相邻记录交界处的差值被丢弃; sampling_rates可以是标量或每个记录一个值。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n_records = len(offsets) - 1
+    fs = np.broadcast_to(np.asarray(sampling_rates, dtype=np.float64), (n_records,))
+
+    peak_records = np.repeat(np.arange(n_records), np.diff(offsets))
+    same_record = peak_records[1:] == peak_records[:-1]
+    rr_records = peak_records[1:][same_record]
+    rr = np.diff(values)[same_record] / fs[rr_records] * 1000
+    return rr, rr_records
+
+
+def _segment_stats(x, segments, n_segments):
+    """按记录分组的数量、均值、总体标准差、最小值和最大值
+
+    x按segments升序排列(由扁平数组过滤得到时总是如此), 空组的统计量为0。
+    """
+    count = np.bincount(segments, minlength=n_segments)
+    nonempty = count > 0
+    total = np.bincount(segments, weights=x, minlength=n_segments)
+    mean = np.divide(total, count, out=np.zeros(n_segments), where=nonempty)
+    # 两遍法求方差, 避免大数相减的精度损失
+    squares = np.bincount(segments, weights=(x - mean[segments]) ** 2, minlength=n_segments)
+    std = np.sqrt(np.divide(squares, count, out=np.zeros(n_segments), where=nonempty))
+
+    minimum = np.zeros(n_segments)
+    maximum = np.zeros(n_segments)
+    if len(x):
+        starts = (np.cumsum(count) - count)[nonempty]
+        minimum[nonempty] = np.minimum.reduceat(x, starts)
+        maximum[nonempty] = np.maximum.reduceat(x, starts)
+    return count, mean, std, minimum, maximum
+
+
+def _successive_differences(x, segments):
+    """同一记录内相邻元素的差值及其所属记录"""
+    same = segments[1:] == segments[:-1]
+    return np.diff(x)[same], segments[1:][same]
+
+
+def batch_rhythm_metrics(values, offsets, sampling_rates, extended=False):
+    """向量化计算所有记录的心率统计、HRV指标和心律失常标志
+
+    过滤规则与ECGAnalyzer中的单记录方法一致: 心率统计只使用40-200 bpm的心搏,
+    HRV只使用300-2000 ms的RR间期, 心律失常判断使用全部RR间期。
+    extended为True时对每个记录的NN间期计算频域和非线性指标(无法跨记录向量化)。
+    返回{指标名: 长度为记录数的数组}。
+    """
+    n_records = len(offsets) - 1
+    rr, rr_records = batch_rr_intervals(values, offsets, sampling_rates)
+
+    # 心率统计
+    heart_rates = 60000 / rr
+    valid = (heart_rates >= 40) & (heart_rates <= 200)
+    _, mean_hr, std_hr, min_hr, max_hr = _segment_stats(
+        heart_rates[valid], rr_records[valid], n_records
+    )
+
+    # HRV: SDNN, RMSSD, pNN50
+    valid = (rr >= 300) & (rr <= 2000)
+    nn, nn_records = rr[valid], rr_records[valid]
+    nn_count, _, sdnn, _, _ = _segment_stats(nn, nn_records, n_records)
+    diff_nn, diff_records = _successive_differences(nn, nn_records)
+    n_diff = np.bincount(diff_records, minlength=n_records)
+    has_diff = nn_count >= 2
+    rmssd = np.sqrt(
+        np.divide(
+            np.bincount(diff_records, weights=diff_nn**2, minlength=n_records),
+            n_diff,
+            out=np.zeros(n_records),
+            where=has_diff,
+        )
+    )
+    pnn50 = 100 * np.divide(
+        np.bincount(diff_records, weights=np.abs(diff_nn) > 50, minlength=n_records),
+        n_diff,
+        out=np.zeros(n_records),
+        where=has_diff,
+    )
+    sdnn[~has_diff] = 0
+
+    # 心律失常: 使用未过滤的RR间期
+    rr_count, mean_rr, std_rr, _, _ = _segment_stats(rr, rr_records, n_records)
+    has_rr = rr_count > 0
+
+    metrics = {
+        "mean_hr": mean_hr,
+        "min_hr": min_hr,
+        "max_hr": max_hr,
+        "std_hr": std_hr,
+        "sdnn": sdnn,
+        "rmssd": rmssd,
+        "pnn50": pnn50,
+        "tachycardia": has_rr & (mean_rr < 600),
+        "bradycardia": has_rr & (mean_rr > 1000),
+        "irregular": has_rr & (std_rr > 150),
+    }
+
+    if extended:
+        # NN间期按记录连续存放, 按数量切分即可; 无法计算的指标(None)存为NaN
+        nn_groups = np.split(nn, np.cumsum(nn_count)[:-1])
+        rows = [
+            extended_hrv_metrics(group if len(group) >= 2 else [])
+            for group in nn_groups
+        ]
+        for key in EXTENDED_HRV_KEYS:
+            metrics[key] = np.array([row[key] for row in rows], dtype=np.float64)
+    return metrics
+
+
+def metrics_records(metrics):
+    """把batch_rhythm_metrics的结果拆分为每个记录的
+    (heart_rate_stats, hrv_metrics, arrhythmia_warnings), 格式与单记录方法相同
+
+    扩展指标中的NaN还原为None。
+    """
+    n_records = len(metrics["mean_hr"])
+    records = []
+    for i in range(n_records):
+        heart_rate_stats = {
+            key: float(metrics[key][i])
+            for key in ("mean_hr", "min_hr", "max_hr", "std_hr")
+        }
+        hrv_metrics = {
+            key: float(metrics[key][i])
+            for key in ("sdnn", "rmssd", "pnn50", *EXTENDED_HRV_KEYS)
+            if key in metrics
+        }
+        for key in EXTENDED_HRV_KEYS:
+            if key in hrv_metrics and np.isnan(hrv_metrics[key]):
+                hrv_metrics[key] = None
+        warnings = [message for key, message in ARRHYTHMIA_MESSAGES if metrics[key][i]]
+        records.append((heart_rate_stats, hrv_metrics, warnings))
+    return records
@@ -0,0 +1,100 @@
+import numpy as np
+
+# 心搏标签
+UNKNOWN = -1  # 靠近记录两端, 窗口不完整
+NORMAL = 0
+PVC = 1  # 形态与模板不同, 疑似室性早搏
+NOISE = 2
+
+LABEL_NAMES = {NORMAL: "normal", PVC: "pvc", NOISE: "noise"}
+
+# 以R峰为中心截取的窗口(秒)
+BEFORE_SECONDS = 0.25
+AFTER_SECONDS = 0.40
+
+# 与模板的相关系数低于该值时视为形态异常
+ABNORMAL_CORRELATION = 0.8
+
+# 峰峰值与模板之比超出该范围的心搏视为噪声
+AMPLITUDE_RANGE = (0.3, 3.0)
+
+# 前一个RR间期短于中位数的该比例时视为提前出现
+PREMATURE_RATIO = 0.85
+
+# 正常心搏少于该比例时模板不可靠, 不判断室早
+MIN_NORMAL_FRACTION = 0.5
+
+
+def segment_beats(data, peaks, before, after):
+    """截取每个R峰前before、后after个采样点, 返回(心搏矩阵, 有效R峰的掩码)
+
+    sliding_window_view是原信号上的视图, 按R峰位置一次索引得到
+    (心搏数, before + after)的矩阵, 不逐个复制心搏。窗口越界的R峰被跳过。
+    """
+    data = np.asarray(data)
+    peaks = np.asarray(peaks, dtype=np.int64)
+    width = before + after
+    valid = (peaks - before >= 0) & (peaks + after <= len(data))
+    if len(data) < width or not valid.any():
+        return np.empty((0, width), dtype=data.dtype), valid
+    windows = np.lib.stride_tricks.sliding_window_view(data, width)
+    return windows[peaks[valid] - before], valid
+
+
+def template_correlation(beats):
+    """中位数模板及每个心搏与模板的皮尔逊相关系数"""
+    template = np.median(beats, axis=0)
+    centered = beats - beats.mean(axis=1, keepdims=True)
+    template_centered = template - template.mean()
+    numerator = centered @ template_centered
+    denominator = np.linalg.norm(centered, axis=1) * np.linalg.norm(template_centered)
+    correlation = np.divide(
+        numerator,
+        denominator,
+        out=np.zeros(len(beats)),
+        where=denominator > 0,
+    )
+    return template, correlation
+
+
+def classify_beats(data, peaks, sampling_rate):
+    """按与中位数模板的相关性把每个心搏标记为NORMAL、PVC或NOISE
+
+    幅度异常的心搏为噪声; 相关系数低于ABNORMAL_CORRELATION且提前出现的为疑似室早
+    (室早常与正常心搏反相, 相关系数可为负), 形态异常但不提前的多为伪差, 记为噪声。
+    返回与peaks等长的标签数组。
+    """
+    before = int(BEFORE_SECONDS * sampling_rate)
+    after = int(AFTER_SECONDS * sampling_rate)
+    labels = np.full(len(peaks), UNKNOWN, dtype=np.int8)
+    beats, valid = segment_beats(data, peaks, before, after)
+    if len(beats) < 3:  # 心搏太少时中位数模板没有意义
+        return labels
+
+    template, correlation = template_correlation(beats)
+    amplitude_ratio = np.ptp(beats, axis=1) / max(np.ptp(template), 1e-12)
+
+    # 每个心搏与前一个R峰的间隔, 第一个R峰没有前一个间隔
+    peaks = np.asarray(peaks)
+    preceding_rr = np.diff(peaks, prepend=-np.inf)[valid]
+    premature = preceding_rr < PREMATURE_RATIO * np.median(np.diff(peaks))
+
+    abnormal = correlation < ABNORMAL_CORRELATION
+    noisy = (
+        (amplitude_ratio < AMPLITUDE_RANGE[0])
+        | (amplitude_ratio > AMPLITUDE_RANGE[1])
+        | (abnormal & ~premature)
+    )
+    beat_labels = np.full(len(beats), NORMAL, dtype=np.int8)
+    beat_labels[abnormal] = PVC
+    beat_labels[noisy] = NOISE
+    if np.mean(beat_labels == NORMAL) < MIN_NORMAL_FRACTION:
+        beat_labels[beat_labels == PVC] = NOISE
+    labels[valid] = beat_labels
+    return labels
+
+
+def count_labels(labels):
+    """各类心搏的数量, 不含UNKNOWN"""
+    labels = np.asarray(labels)
+    return {name: int(np.sum(labels == label)) for label, name in LABEL_NAMES.items()}
@@ -0,0 +1,387 @@
+"""ECG分析各阶段的基准测试
+
+使用合成ECG数据, 不依赖真实记录。示例:
+
+    python benchmark.py --duration 300 --files 20 --output bench.json
+    python benchmark.py --baseline bench.json --tolerance 0.2
+
+每个阶段记录多次运行的耗时(最小值/中位数/平均值)和一次单独运行的
+内存峰值(tracemalloc, 多进程批量分析只统计主进程)。
+指定--baseline时与之前的结果比较, 任何阶段的中位数变慢超过tolerance时返回非0。
+导入main的耗时在新的解释器中测量; 指定--import-budget时, 导入耗时超出预算
+或导入时加载了应按需加载的依赖(LAZY_MODULES)也返回非0。
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# 合成数据的默认参数, 与Apple Watch导出的记录一致
+DEFAULT_SAMPLING_RATE = 512.0
+
+# 合成ECG的波形: (相对R峰的时间(秒), 幅度(µV), 宽度(秒))
+ECG_WAVES = (
+    (-0.20, 100.0, 0.025),  # P
+    (-0.03, -120.0, 0.010),  # Q
+    (0.00, 1000.0, 0.012),  # R
+    (0.03, -250.0, 0.010),  # S
+    (0.25, 250.0, 0.040),  # T
+)
+
+# 扩展HRV指标(频域和样本熵)测试使用的RR间期序列长度, 约为24小时Holter记录的心搏数
+EXTENDED_HRV_BEATS = 100_000
+
+# 只应在绘图或比较分析时才导入的依赖
+LAZY_MODULES = ("matplotlib", "statsmodels")
+
+# 在子进程中测量导入main的耗时, 并列出已加载的按需依赖
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+seconds = time.perf_counter() - start
+loaded = [m for m in {modules!r} if m in sys.modules]
+print(json.dumps({{"seconds": seconds, "lazy_modules_loaded": loaded}}))
+"""
+
+
+def synthetic_ecg(duration, heart_rate=70.0, sampling_rate=DEFAULT_SAMPLING_RATE, seed=0):
+    """生成合成ECG(µV)
+
+    每个心搏由P、QRS、T波的高斯函数叠加而成, RR间期带有呼吸性窦性心律不齐
+    和随机抖动, 另外叠加基线漂移和白噪声。返回(信号, R峰采样位置)。
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration * sampling_rate)
+    t = np.arange(n) / sampling_rate
+
+    mean_rr = 60.0 / heart_rate
+    n_beats = int(duration / mean_rr) + 2
+    rr = mean_rr * (
+        1
+        + 0.05 * np.sin(2 * np.pi * 0.25 * np.arange(n_beats) * mean_rr)
+        + 0.02 * rng.standard_normal(n_beats)
+    )
+    beat_times = 0.5 + np.cumsum(rr) - rr[0]
+    beat_times = beat_times[beat_times < duration - 0.5]
+
+    ecg = np.zeros(n)
+    half_window = int(0.4 * sampling_rate)
+    offsets = np.arange(-half_window, half_window + 1) / sampling_rate
+    for beat in beat_times:
+        center = int(round(beat * sampling_rate))
+        lo = max(center - half_window, 0)
+        hi = min(center + half_window + 1, n)
+        local = offsets[lo - center + half_window : hi - center + half_window]
+        for shift, amplitude, width in ECG_WAVES:
+            ecg[lo:hi] += amplitude * np.exp(-0.5 * ((local - shift) / width) ** 2)
+
+    ecg += 80 * np.sin(2 * np.pi * 0.3 * t)  # 基线漂移
+    ecg += 15 * rng.standard_normal(n)  # 噪声
+    peaks = np.round(beat_times * sampling_rate).astype(np.int64)
+    return ecg, peaks
+
+
+def synthetic_rr(n_beats, heart_rate=70.0, seed=0):
+    """生成n_beats个RR间期(ms), 带有呼吸性窦性心律不齐(HF)、
+    Mayer波(LF)和随机抖动, 使频域指标和样本熵都有定义"""
+    rng = np.random.default_rng(seed)
+    mean_rr = 60000.0 / heart_rate
+    t = np.arange(n_beats) * mean_rr / 1000
+    return mean_rr * (
+        1
+        + 0.05 * np.sin(2 * np.pi * 0.25 * t)
+        + 0.03 * np.sin(2 * np.pi * 0.1 * t)
+        + 0.02 * rng.standard_normal(n_beats)
+    )
+
+
+def write_ecg_csv(path, samples, sampling_rate, record_date):
+    """按Apple Health导出的格式写入CSV"""
+    header = [
+        "姓名,基准测试",
+        f"记录日期,{record_date:%Y-%m-%d %H:%M:%S} +0800",
+        "分类,窦性心律",
+        "症状,",
+        "软件版本,1.90",
+        "设备,synthetic",
+        f"采样率,{sampling_rate:g}赫兹",
+        "",
+        "",
+        "导联,导联I",
+        "单位,µV",
+        "",
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(header) + "\n")
+        np.savetxt(f, samples, fmt="%.3f")
+
+
+def measure(func, repeat):
+    """运行func多次, 返回耗时统计和单独一次运行的内存峰值"""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "runs": repeat,
+        "min_s": min(durations),
+        "median_s": statistics.median(durations),
+        "mean_s": statistics.fmean(durations),
+        "peak_mb": peak / 2**20,
+    }
+
+
+def measure_import(repeat):
+    """在新的解释器中导入main多次, 返回耗时统计和导入时加载的按需依赖"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [os.path.dirname(os.path.abspath(__file__)), env.get("PYTHONPATH")])
+    )
+    code = IMPORT_PROBE.format(modules=LAZY_MODULES)
+    probes = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        probes.append(json.loads(output.strip().splitlines()[-1]))
+
+    durations = [probe["seconds"] for probe in probes]
+    return {
+        "runs": repeat,
+        "min_s": min(durations),
+        "median_s": statistics.median(durations),
+        "mean_s": statistics.fmean(durations),
+        "lazy_modules_loaded": probes[-1]["lazy_modules_loaded"],
+    }
+
+
+def run_benchmarks(args):
+    """在临时工作目录中生成数据并测试各阶段, 返回结果字典"""
+    # main在导入时按这些目录创建缓存和存储; 全部指向工作目录, 环境变量中
+    # 已有的目录(例如生产环境的数据和缓存)不会被读取或清空, 导入测试的子进程同样继承
+    os.makedirs(os.path.join(args.work_dir, "data"), exist_ok=True)
+    os.chdir(args.work_dir)
+    for variable, name in (
+        ("ECG_DATA_DIR", "data"),
+        ("ECG_RESULTS_DIR", "results"),
+        ("ECG_CACHE_DIR", "cache"),
+    ):
+        os.environ[variable] = os.path.join(args.work_dir, name)
+
+    start_date = datetime(2025, 1, 1, 8, 0, 0)
+    for i in range(args.files):
+        samples, _ = synthetic_ecg(
+            args.duration, args.heart_rate, args.sampling_rate, seed=i
+        )
+        write_ecg_csv(
+            os.path.join("data", f"ecg_bench_{i:04d}.csv"),
+            samples,
+            args.sampling_rate,
+            start_date + timedelta(days=i),
+        )
+    file_path = os.path.join("data", "ecg_bench_0000.csv")
+
+    print("import_main...", file=sys.stderr)
+    import_stats = measure_import(args.repeat)
+
+    import main
+    from hrv import extended_hrv_metrics
+    from plot_store import PlotStore
+    from result_cache import ResultCache
+
+    plain = main.ECGAnalyzer()
+    _, data = plain.load_data(file_path)
+    fs = args.sampling_rate
+    processed = plain.process_signal(data, sampling_rate=fs)
+    peaks = plain.detect_peaks(processed, sampling_rate=fs)
+
+    def hrv_metrics():
+        rr = plain.rr_intervals(peaks, sampling_rate=fs)
+        plain.calculate_heart_rate(peaks, rr_intervals=rr)
+        plain.calculate_hrv_metrics(peaks, rr_intervals=rr)
+        plain.detect_arrhythmia(peaks, rr_intervals=rr)
+
+    long_rr = synthetic_rr(EXTENDED_HRV_BEATS, args.heart_rate)
+
+    sidecar = main.ECGAnalyzer(sidecar_dir=os.path.join("bench", "sidecars"))
+    sidecar.load_data(file_path)  # 生成侧车文件
+    uncached = main.ECGAnalyzer(plot_store=PlotStore(os.path.join("bench", "plots")))
+    cached = main.ECGAnalyzer(
+        result_cache=ResultCache(os.path.join("bench", "results")),
+        plot_store=PlotStore(os.path.join("bench", "plots")),
+    )
+    cached.analyze_file(file_path)  # 写入缓存
+
+    def analyze_all_cold():
+        # 清空指标存储和所有缓存, 每个文件都从解析CSV开始重新分析
+        db_path = main.metrics_store.db_path
+        os.remove(db_path)
+        main.metrics_store = main.MetricsStore(db_path)
+        main.analyzer.result_cache.clear()
+        main.analyzer.model_store.clear()
+        shutil.rmtree(main.analyzer.sidecar_dir, ignore_errors=True)
+        main.analyze_all_files(workers=args.workers)
+
+    stages = {
+        "load_data_csv": lambda: plain.load_data(file_path),
+        "load_data_sidecar": lambda: sidecar.load_data(file_path),
+        "process_signal": lambda: plain.process_signal(data, sampling_rate=fs),
+        "detect_peaks": lambda: plain.detect_peaks(processed, sampling_rate=fs),
+        "hrv_metrics": hrv_metrics,
+        "extended_hrv": lambda: extended_hrv_metrics(long_rr),
+        "plot_ecg": lambda: plain.plot_ecg(processed, peaks, "bench", sampling_rate=fs),
+        "analyze_file": lambda: uncached.analyze_file(file_path),
+        "analyze_file_cached": lambda: cached.analyze_file(file_path),
+    }
+    results = {"import_main": import_stats}
+    for name, func in stages.items():
+        print(f"{name}...", file=sys.stderr)
+        results[name] = measure(func, args.repeat)
+
+    print("analyze_all_files...", file=sys.stderr)
+    main.analyze_all_files(workers=args.workers)  # 创建指标存储
+    results["analyze_all_files_cold"] = measure(analyze_all_cold, 1)
+    results["analyze_all_files_warm"] = measure(
+        lambda: main.analyze_all_files(workers=args.workers), args.repeat
+    )
+
+    return {
+        "config": {
+            "duration_s": args.duration,
+            "heart_rate": args.heart_rate,
+            "sampling_rate": args.sampling_rate,
+            "files": args.files,
+            "workers": args.workers,
+            "repeat": args.repeat,
+            "samples": int(len(data)),
+            "beats": int(len(peaks)),
+            "extended_hrv_beats": EXTENDED_HRV_BEATS,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "cpu_count": os.cpu_count(),
+            "analysis_version": main.ANALYSIS_VERSION,
+        },
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "stages": results,
+    }
+
+
+def compare_with_baseline(report, baseline, tolerance):
+    """打印与基线的对比, 返回变慢超过tolerance的阶段"""
+    regressions = []
+    print(f"{'阶段':<26}{'基线(ms)':>12}{'当前(ms)':>12}{'比值':>8}")
+    for name, current in report["stages"].items():
+        previous = baseline.get("stages", {}).get(name)
+        if previous is None:
+            continue
+        ratio = current["median_s"] / previous["median_s"]
+        flag = " !" if ratio > 1 + tolerance else ""
+        print(
+            f"{name:<26}{previous['median_s'] * 1000:>12.2f}"
+            f"{current['median_s'] * 1000:>12.2f}{ratio:>8.2f}{flag}"
+        )
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ECG分析各阶段的基准测试")
+    parser.add_argument("--duration", type=float, default=30.0, help="每条记录的时长(秒)")
+    parser.add_argument("--heart-rate", type=float, default=70.0, help="平均心率(bpm)")
+    parser.add_argument("--sampling-rate", type=float, default=DEFAULT_SAMPLING_RATE)
+    parser.add_argument("--files", type=int, default=10, help="批量分析的文件数")
+    parser.add_argument("--workers", type=int, default=1, help="批量分析的进程数")
+    parser.add_argument("--repeat", type=int, default=5, help="每个阶段的运行次数")
+    parser.add_argument("--output", help="结果JSON文件, 默认输出到标准输出")
+    parser.add_argument("--baseline", help="用于比较的历史结果JSON文件")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的变慢比例")
+    parser.add_argument("--work-dir", help="生成数据和缓存的目录, 默认使用临时目录")
+    parser.add_argument("--import-budget", type=float, help="导入main允许的最长耗时(秒)")
+    args = parser.parse_args()
+
+    # 切换工作目录前把输入输出路径转换为绝对路径
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    temp_dir = None
+    if args.work_dir is None:
+        temp_dir = tempfile.mkdtemp(prefix="ecg-bench-")
+        args.work_dir = temp_dir
+    else:
+        args.work_dir = os.path.abspath(args.work_dir)
+    try:
+        report = run_benchmarks(args)
+    finally:
+        if temp_dir:
+            os.chdir(os.path.dirname(temp_dir))
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    failed = False
+    if baseline is not None:
+        regressions = compare_with_baseline(report, baseline, args.tolerance)
+        if regressions:
+            print(f"变慢的阶段: {', '.join(regressions)}", file=sys.stderr)
+            failed = True
+
+    if args.import_budget is not None:
+        import_stats = report["stages"]["import_main"]
+        if import_stats["median_s"] > args.import_budget:
+            print(
+                f"导入main耗时{import_stats['median_s']:.3f}秒, "
+                f"超出预算{args.import_budget:.3f}秒",
+                file=sys.stderr,
+            )
+            failed = True
+        if import_stats["lazy_modules_loaded"]:
+            print(
+                f"导入main时加载了按需依赖: {', '.join(import_stats['lazy_modules_loaded'])}",
+                file=sys.stderr,
+            )
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+from functools import lru_cache
+
+from scipy import signal
+
+
+@lru_cache(maxsize=64)
+def butter_sos(order, cutoff, fs, btype):
+    """设计Butterworth滤波器(二阶节形式), 按(阶数, 截止频率, 采样率, 类型)缓存
+
+    cutoff为单个频率或(低, 高)元组, 单位Hz。
+    """
+    nyquist = fs / 2
+    if isinstance(cutoff, tuple):
+        wn = [c / nyquist for c in cutoff]
+    else:
+        wn = cutoff / nyquist
+    # 返回的系数被所有调用共享, 调用方不应修改
+    return signal.butter(order, wn, btype=btype, output="sos")
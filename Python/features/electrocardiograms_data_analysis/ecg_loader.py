@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+# 侧车文件格式版本, 修改格式后递增以使旧文件失效
+SIDECAR_VERSION = 1
+
+SAMPLE_DTYPE = np.float32
+
+
+def is_sample_line(text):
+    """是否为数值数据行(第一列可以解析为数值)"""
+    try:
+        float(text.split(",", 1)[0])
+    except ValueError:
+        return False
+    return True
+
+
+def parse_header_line(header, line):
+    """把"键,值"形式的头信息行加入header"""
+    if "," in line:
+        key, value = line.split(",", 1)
+        header[key] = value.strip('"')
+
+
+def read_ecg_header(file_path):
+    """只读取文件头信息(第一行数值之前的键值对)"""
+    header = {}
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip().lstrip("\ufeff")
+            if line and is_sample_line(line):
+                break
+            parse_header_line(header, line)
+    return header
+
+
+def parse_sampling_rate(header):
+    """从头信息的"采样率"一行(如"510.852赫兹")解析采样率, 缺失时返回None"""
+    match = re.search(r"\d+(?:\.\d+)?", header.get("采样率", ""))
+    if not match:
+        return None
+    sampling_rate = float(match.group())
+    return sampling_rate if sampling_rate > 0 else None
+
+
+def parse_ecg_csv(file_path):
+    """单次读取解析Apple Watch导出的ECG CSV, 返回(头信息, float32采样数组)"""
+    with open(file_path, "rb") as f:
+        raw = f.read()
+
+    # 逐行读取头信息, 直到遇到第一行数值
+    header = {}
+    pos = 0
+    while pos < len(raw):
+        end = raw.find(b"\n", pos)
+        if end == -1:
+            end = len(raw)
+        line = raw[pos:end].decode("utf-8").strip().lstrip("\ufeff")
+        if line and is_sample_line(line):
+            break
+        parse_header_line(header, line)
+        pos = end + 1
+
+    body = raw[pos:]
+    if b"," in body[: body.find(b"\n")]:
+        # 多列数据时只取第一列
+        body = b"\n".join(row.split(b",", 1)[0] for row in body.splitlines())
+    samples = np.array(body.split(), dtype=SAMPLE_DTYPE)
+    return header, samples
+
+
+def _sidecar_paths(file_path, sidecar_dir):
+    """侧车文件路径, 按源文件绝对路径的哈希区分不同目录下的同名文件"""
+    path_hash = hashlib.sha256(os.path.abspath(file_path).encode("utf-8")).hexdigest()
+    name = f"{os.path.basename(file_path)}.{path_hash[:16]}"
+    return (
+        os.path.join(sidecar_dir, f"{name}.f32.npy"),
+        os.path.join(sidecar_dir, f"{name}.json"),
+    )
+
+
+def _read_sidecar(file_path, sidecar_dir):
+    """侧车文件存在且与源文件一致时, 以内存映射方式读取采样数据"""
+    npy_path, meta_path = _sidecar_paths(file_path, sidecar_dir)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        stat = os.stat(file_path)
+    except (OSError, ValueError):
+        return None
+
+    if (
+        meta.get("version") != SIDECAR_VERSION
+        or meta.get("source_mtime_ns") != stat.st_mtime_ns
+        or meta.get("source_size") != stat.st_size
+    ):
+        return None
+
+    try:
+        samples = np.load(npy_path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    if samples.shape != (meta["n_samples"],):
+        return None
+    return meta["header"], samples
+
+
+def write_sidecar(file_path, sidecar_dir, header, samples):
+    """写入侧车文件: float32的.npy采样数据和JSON头信息"""
+    os.makedirs(sidecar_dir, exist_ok=True)
+    npy_path, meta_path = _sidecar_paths(file_path, sidecar_dir)
+    stat = os.stat(file_path)
+    meta = {
+        "version": SIDECAR_VERSION,
+        "source_mtime_ns": stat.st_mtime_ns,
+        "source_size": stat.st_size,
+        "n_samples": len(samples),
+        "header": header,
+    }
+
+    # 先写数据再写头信息, 头信息存在即表示侧车文件完整
+    suffix = f".{os.getpid()}.tmp"
+    with open(npy_path + suffix, "wb") as f:
+        np.save(f, samples)
+    os.replace(npy_path + suffix, npy_path)
+    with open(meta_path + suffix, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(meta_path + suffix, meta_path)
+
+
+def load_ecg(file_path, sidecar_dir=None):
+    """加载ECG数据, 返回(头信息, 采样数组)
+
+    指定sidecar_dir时, 首次加载解析CSV并写入二进制侧车文件,
+    之后源文件未修改时直接内存映射侧车文件, 不再解析文本。
+    """
+    if sidecar_dir is not None:
+        cached = _read_sidecar(file_path, sidecar_dir)
+        if cached is not None:
+            return cached
+
+    header, samples = parse_ecg_csv(file_path)
+    if sidecar_dir is not None:
+        try:
+            write_sidecar(file_path, sidecar_dir, header, samples)
+        except OSError as e:
+            print(f"写入侧车文件 {file_path} 时出错: {str(e)}")
+    return header, samples
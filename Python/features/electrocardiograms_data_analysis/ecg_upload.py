@@ -0,0 +1,152 @@
+import hashlib
+
+import numpy as np
+
+from ecg_loader import SAMPLE_DTYPE, is_sample_line, parse_header_line
+
+# 每次从请求流中读取的字节数
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# CSV中每个采样至少占2字节(一位数字和换行), 由内容长度得到采样数的上限
+CSV_MIN_BYTES_PER_SAMPLE = 2
+
+# 不知道内容长度(分块传输)时的初始容量
+MIN_BUFFER_CAPACITY = 1 << 16
+
+
+class UploadTooLarge(ValueError):
+    """上传内容超过大小限制"""
+
+
+class SampleBuffer:
+    """预分配的采样缓冲区, 容量不足时按倍数扩容
+
+    容量按上限预分配时, numpy的大块内存只占用虚拟地址空间,
+    未写入的页不占物理内存。
+    """
+
+    def __init__(self, capacity=0, dtype=SAMPLE_DTYPE):
+        self._data = np.empty(max(capacity, MIN_BUFFER_CAPACITY), dtype=dtype)
+        self.size = 0
+
+    def extend(self, values):
+        end = self.size + len(values)
+        if end > len(self._data):
+            grown = np.empty(max(end, 2 * len(self._data)), dtype=self._data.dtype)
+            grown[: self.size] = self._data[: self.size]
+            self._data = grown
+        self._data[self.size : end] = values
+        self.size = end
+
+    def view(self):
+        """已写入部分的视图"""
+        return self._data[: self.size]
+
+
+class CSVStreamParser:
+    """逐块解析Apple Watch导出格式的CSV, 结果与ecg_loader.parse_ecg_csv一致
+
+    只保留跨块的半行, 数值行解析后直接写入缓冲区, 不保留整个文本。
+    """
+
+    def __init__(self, content_length=None):
+        capacity = (content_length or 0) // CSV_MIN_BYTES_PER_SAMPLE
+        self.header = {}
+        self.buffer = SampleBuffer(capacity)
+        self._pending = b""
+        self._in_header = True
+
+    def feed(self, chunk):
+        data = self._pending + chunk
+        end = data.rfind(b"\n")
+        if end == -1:
+            self._pending = data
+            return
+        self._pending = data[end + 1 :]
+        self._parse(data[: end + 1])
+
+    def finish(self):
+        """处理最后不以换行结尾的一行, 返回(头信息, 采样数组)"""
+        if self._pending:
+            self._parse(self._pending)
+            self._pending = b""
+        return self.header, self.buffer.view()
+
+    def _parse(self, data):
+        pos = 0
+        while self._in_header and pos < len(data):
+            end = data.find(b"\n", pos)
+            if end == -1:
+                end = len(data)
+            line = data[pos:end].decode("utf-8").strip().lstrip("\ufeff")
+            if line and is_sample_line(line):
+                self._in_header = False
+                break
+            parse_header_line(self.header, line)
+            pos = end + 1
+        if self._in_header:
+            return
+
+        body = data[pos:]
+        if b"," in body:
+            # 多列数据时只取第一列
+            body = b"\n".join(row.split(b",", 1)[0] for row in body.splitlines())
+        try:
+            self.buffer.extend(np.array(body.split(), dtype=SAMPLE_DTYPE))
+        except ValueError:
+            raise ValueError("CSV中含有无法解析的采样值") from None
+
+
+class BinaryStreamParser:
+    """逐块解析小端float32采样, 头信息由调用方提供"""
+
+    def __init__(self, header, content_length=None):
+        self.header = header
+        self.buffer = SampleBuffer((content_length or 0) // 4)
+        self._pending = b""
+
+    def feed(self, chunk):
+        data = self._pending + chunk
+        usable = len(data) - len(data) % 4
+        self._pending = data[usable:]
+        self.buffer.extend(np.frombuffer(data, dtype="<f4", count=usable // 4))
+
+    def finish(self):
+        if self._pending:
+            raise ValueError("二进制数据长度不是4字节的整数倍")
+        return self.header, self.buffer.view()
+
+
+def receive_upload(stream, parser, spool=None, max_bytes=None, chunk_size=UPLOAD_CHUNK_SIZE):
+    """从请求流中逐块读取上传内容, 返回(头信息, 采样数组, 内容的SHA-256)
+
+    每块同时交给parser解析、写入spool文件(可为None)并更新哈希。
+    """
+    sha = hashlib.sha256()
+    received = 0
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        received += len(chunk)
+        if max_bytes is not None and received > max_bytes:
+            raise UploadTooLarge(f"上传内容超过{max_bytes}字节")
+        sha.update(chunk)
+        if spool is not None:
+            spool.write(chunk)
+        parser.feed(chunk)
+
+    header, samples = parser.finish()
+    if not len(samples):
+        raise ValueError("上传内容中没有采样数据")
+    return header, samples, sha.hexdigest()
+
+
+def write_ecg_csv(f, header, samples):
+    """按Apple Health导出的格式写入CSV, 采样值按float32往返精度输出"""
+    lines = [f"{key},{value}" for key, value in header.items()]
+    f.write(("\n".join(lines) + "\n\n").encode("utf-8"))
+    np.savetxt(f, samples, fmt="%.9g")
+
+
+def file_sha256(path):
+    """分块计算文件内容的SHA-256"""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
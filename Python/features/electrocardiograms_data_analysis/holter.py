@@ -0,0 +1,267 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from scipy import signal
+
+from analysis_result import AnalysisResult, SignalHandle
+from beat_classifier import AFTER_SECONDS, BEFORE_SECONDS, count_labels
+from ecg_filters import butter_sos
+from ecg_loader import is_sample_line, parse_header_line
+
+
+def convert_csv_to_npy(csv_path, npy_path, chunk_rows=1_000_000):
+    """把多导联CSV分块转换为(采样数, 导联数)的float32 .npy文件, 返回头信息
+
+    第一遍只统计行数, 第二遍按chunk_rows行分块解析并写入内存映射文件,
+    内存占用与文件大小无关。
+    """
+    header = {}
+    with open(csv_path, "r", encoding="utf-8") as f:
+        # 头信息: 第一行数值之前的键值对
+        n_header_lines = 0
+        for line in f:
+            stripped = line.strip().lstrip("\ufeff")
+            if stripped and is_sample_line(stripped):
+                n_leads = len(stripped.split(","))
+                break
+            parse_header_line(header, stripped)
+            n_header_lines += 1
+        else:
+            raise ValueError(f"{csv_path} 中没有数值数据")
+
+        # 统计数值行数
+        n_samples = 1 + sum(1 for line in f if line.strip())
+
+    out = np.lib.format.open_memmap(
+        npy_path, mode="w+", dtype=np.float32, shape=(n_samples, n_leads)
+    )
+    with open(csv_path, "r", encoding="utf-8") as f:
+        for _ in range(n_header_lines):
+            f.readline()
+        written = 0
+        while written < n_samples:
+            rows = np.loadtxt(
+                f, delimiter=",", dtype=np.float32, max_rows=chunk_rows, ndmin=2
+            )
+            if len(rows) == 0:
+                break
+            out[written : written + len(rows)] = rows
+            written += len(rows)
+    out.flush()
+    return header
+
+
+def open_recording(npy_path):
+    """内存映射方式打开.npy记录, 单导联数据转换为(采样数, 1)"""
+    data = np.load(npy_path, mmap_mode="r")
+    if data.ndim == 1:
+        data = data[:, np.newaxis]
+    return data
+
+
+class ChunkedECGProcessor:
+    """长时程(Holter)多导联ECG的分块处理引擎
+
+    滤波和R峰检测按块进行, 每块两侧各读取pad_seconds的重叠数据以消除
+    零相位滤波的边界效应(overlap-save), 只保留中间部分的结果;
+    中间结果写入work_dir中的内存映射文件, 内存占用只取决于块大小。
+    检测阈值与内存路径相同(全局最大值的30%), 因此需要两遍扫描。
+
+    R峰检测的平滑信号用完即删除, 滤波后的信号保留在work_dir中作为结果的数据。
+    指定work_dir时目录及其中的文件由调用方负责清理; 未指定时使用自动创建的临时目录,
+    由close()删除(可用with语句)。
+    """
+
+    def __init__(
+        self,
+        analyzer,
+        sampling_rate,
+        chunk_seconds=300.0,
+        pad_seconds=10.0,
+        work_dir=None,
+    ):
+        self.analyzer = analyzer
+        self.sampling_rate = float(sampling_rate)
+        self.chunk_size = int(chunk_seconds * self.sampling_rate)
+        self.pad = int(pad_seconds * self.sampling_rate)
+        # 只有自动创建的临时目录由close()删除
+        self._owns_work_dir = work_dir is None
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="holter-")
+        os.makedirs(self.work_dir, exist_ok=True)
+
+        fs = self.sampling_rate
+        self._bandpass = butter_sos(3, (5.0, 15.0), fs, "bandpass")
+        self._window = int(0.1 * fs)
+        self._distance = int(0.2 * fs)
+
+    def close(self):
+        """删除自动创建的临时目录, 调用方指定的work_dir保持不变"""
+        if self._owns_work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+            self._owns_work_dir = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _chunks(self, n):
+        for start in range(0, n, self.chunk_size):
+            yield start, min(start + self.chunk_size, n)
+
+    @staticmethod
+    def _read(data, start, stop, pad):
+        """读取[start-pad, stop+pad)范围的数据, 返回(数据, 左侧实际重叠长度)"""
+        lo = max(0, start - pad)
+        hi = min(len(data), stop + pad)
+        return np.asarray(data[lo:hi], dtype=np.float64), start - lo
+
+    def _output_path(self, name):
+        return os.path.join(self.work_dir, f"{name}.npy")
+
+    def _open_output(self, name, length):
+        return np.lib.format.open_memmap(
+            self._output_path(name), mode="w+", dtype=np.float64, shape=(length,)
+        )
+
+    def filter_lead(self, lead, name):
+        """分块执行与process_signal相同的滤波, 结果写入内存映射文件"""
+        n = len(lead)
+        out = self._open_output(f"{name}.processed", n)
+        for start, stop in self._chunks(n):
+            chunk, offset = self._read(lead, start, stop, self.pad)
+            filtered = self.analyzer.process_signal(
+                chunk, sampling_rate=self.sampling_rate
+            )
+            out[start:stop] = filtered[offset : offset + stop - start]
+        out.flush()
+        return out
+
+    def detect_lead_peaks(self, processed, name):
+        """分块执行与detect_peaks相同的R峰检测"""
+        n = len(processed)
+        if n < 2:
+            return np.empty(0, dtype=np.int64)
+
+        # 第一遍: 带通、求导、平方、移动平均, 记录全局最大值
+        smoothed = self._open_output(f"{name}.smoothed", n - 1)
+        window = np.ones(self._window) / self._window
+        global_max = -np.inf
+        for start, stop in self._chunks(n - 1):
+            chunk, offset = self._read(processed, start, stop + 1, self.pad)
+            filtered = signal.sosfiltfilt(self._bandpass, chunk)
+            diff = np.diff(filtered)
+            local = np.convolve(diff * diff, window, mode="same")
+            part = local[offset : offset + stop - start]
+            smoothed[start:stop] = part
+            global_max = max(global_max, float(part.max()))
+
+        # 第二遍: 按全局阈值检测峰值, 每块两侧多读一个最小间隔
+        height = 0.3 * global_max
+        peaks = []
+        for start, stop in self._chunks(n - 1):
+            chunk, offset = self._read(smoothed, start, stop, self._distance)
+            found, _ = signal.find_peaks(chunk, height=height, distance=self._distance)
+            found = found - offset
+            found = found[(found >= 0) & (found < stop - start)] + start
+            peaks.append(found)
+        peaks = np.concatenate(peaks) if peaks else np.empty(0, dtype=np.int64)
+
+        # 块边界两侧的峰值间隔小于最小间隔时保留较高的一个
+        merged = []
+        for peak in peaks:
+            if merged and peak - merged[-1] < self._distance:
+                if smoothed[peak] > smoothed[merged[-1]]:
+                    merged[-1] = peak
+                continue
+            merged.append(peak)
+
+        # 平滑信号只在检测时使用, 释放映射后删除
+        del smoothed
+        try:
+            os.remove(self._output_path(f"{name}.smoothed"))
+        except OSError:
+            pass
+        return np.asarray(merged, dtype=np.int64)
+
+    def classify_lead_beats(self, processed, peaks):
+        """分块执行与classify_beats相同的心搏分类, 返回与peaks等长的标签数组
+
+        每块用自己的中位数模板; 两侧重叠部分的R峰也参与分类, 使块边界处的心搏
+        有完整的窗口和前一个RR间期, 只保留本块内R峰的标签。
+        """
+        labels = np.empty(len(peaks), dtype=np.int8)
+        # 重叠至少要容纳一个心搏窗口
+        window = max(BEFORE_SECONDS, AFTER_SECONDS)
+        pad = max(self.pad, int(window * self.sampling_rate) + 1)
+        for start, stop in self._chunks(len(processed)):
+            chunk, offset = self._read(processed, start, stop, pad)
+            lo, hi = np.searchsorted(peaks, (start - offset, start - offset + len(chunk)))
+            first, last = np.searchsorted(peaks, (start, stop))
+            chunk_labels = self.analyzer.classify_beats(
+                chunk, peaks[lo:hi] - (start - offset), sampling_rate=self.sampling_rate
+            )
+            labels[first:last] = chunk_labels[first - lo : last - lo]
+        return labels
+
+    def analyze(self, data, name="holter", header=None):
+        """分析(采样数, 导联数)的记录, 每个导联返回一个AnalysisResult"""
+        header = header or {}
+        if data.ndim == 1:
+            data = data[:, np.newaxis]
+        fs = self.sampling_rate
+        n_samples = data.shape[0]
+
+        analyzer = self.analyzer
+        leads = []
+        for lead_idx in range(data.shape[1]):
+            lead_name = f"{name}.lead{lead_idx + 1}"
+            processed = self.filter_lead(data[:, lead_idx], lead_name)
+            peaks = self.detect_lead_peaks(processed, lead_name)
+            labels = self.classify_lead_beats(processed, peaks)
+            leads.append((lead_name, processed, peaks, labels))
+
+        # 所有导联的心率、HRV和心律失常指标一次计算
+        metrics = analyzer.batch_metrics(
+            [peaks for _, _, peaks, _ in leads],
+            fs,
+            extended=True,
+            beat_labels=[labels for _, _, _, labels in leads],
+        )
+
+        results = []
+        for (lead_name, processed, peaks, labels), (hr_stats, hrv, warnings) in zip(
+            leads, metrics
+        ):
+            _, trend_rates = analyzer.windowed_heart_rate(
+                peaks, n_samples, 30, sampling_rate=fs
+            )
+            trend = analyzer.analyze_trend(
+                processed, peaks, sampling_rate=fs, heart_rates=trend_rates
+            )
+            results.append(
+                AnalysisResult(
+                    file_name=lead_name,
+                    record_date=header.get("记录日期", "Unknown"),
+                    classification=header.get("分类", "Unknown"),
+                    sampling_rate=fs,
+                    duration=n_samples / fs,
+                    total_beats=len(peaks),
+                    beat_counts=count_labels(labels),
+                    heart_rate_stats=hr_stats,
+                    hrv_metrics=hrv,
+                    arrhythmia_warnings=warnings,
+                    trend_analysis=trend,
+                    signals=SignalHandle(
+                        arrays={
+                            "processed_data": processed,
+                            "peaks": peaks,
+                            "beat_labels": labels,
+                        }
+                    ),
+                )
+            )
+        return results
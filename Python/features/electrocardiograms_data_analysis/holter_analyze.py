@@ -0,0 +1,77 @@
+"""长时程(Holter)多导联记录的分块分析
+
+输入为多导联CSV(每行一个采样, 每列一个导联, 可带Apple Health格式的头信息)
+或(采样数, 导联数)的.npy文件, 每个导联输出一行JSON摘要。示例:
+
+    python holter_analyze.py holter_24h.csv --output holter.jsonl
+    python holter_analyze.py holter_24h.npy --sampling-rate 500 --work-dir holter_work
+
+CSV先转换为work_dir中的.npy文件再内存映射分析, 内存占用只取决于块大小。
+未指定--work-dir时中间文件放在临时目录, 输出完成后删除; 指定时保留, 由调用方清理。
+"""
+
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分块分析长时程多导联ECG记录")
+    parser.add_argument("input", help="多导联CSV或.npy文件")
+    parser.add_argument("--sampling-rate", type=float, help="采样率(Hz), 默认从CSV头信息读取")
+    parser.add_argument("--chunk-seconds", type=float, default=300.0, help="每块的时长(秒)")
+    parser.add_argument("--pad-seconds", type=float, default=10.0, help="块两侧的重叠时长(秒)")
+    parser.add_argument("--work-dir", help="中间文件目录, 默认使用临时目录并在结束后删除")
+    parser.add_argument("--output", default="-", help="输出的JSON Lines文件, 默认输出到标准输出")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main as ecg_app
+    from batch_analyze import JsonLinesWriter, summary_record
+    from holter import convert_csv_to_npy
+
+    temp_dir = None
+    if args.work_dir is None:
+        temp_dir = tempfile.mkdtemp(prefix="holter-")
+        work_dir = temp_dir
+    else:
+        work_dir = os.path.abspath(args.work_dir)
+        os.makedirs(work_dir, exist_ok=True)
+
+    writer = JsonLinesWriter(args.output)
+    try:
+        header = {}
+        npy_path = args.input
+        if not args.input.endswith(".npy"):
+            name = os.path.splitext(os.path.basename(args.input))[0]
+            npy_path = os.path.join(work_dir, f"{name}.npy")
+            header = convert_csv_to_npy(args.input, npy_path)
+
+        # 分析过程的提示输出到标准错误, 标准输出只用于JSON Lines结果
+        with contextlib.redirect_stdout(sys.stderr):
+            results = ecg_app.analyzer.analyze_holter(
+                npy_path,
+                work_dir,
+                sampling_rate=args.sampling_rate,
+                header=header,
+                chunk_seconds=args.chunk_seconds,
+                pad_seconds=args.pad_seconds,
+            )
+        for result in results:
+            result.health_evaluation = ecg_app.analyzer.evaluate_health_status(result)
+            record = summary_record(args.input, result)
+            record["file_name"] = result.file_name  # 记录名.lead<导联序号>
+            writer.write(record)
+        # 结果中的信号映射work_dir中的文件, 删除目录前释放
+        del results
+    finally:
+        writer.close()
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# 直方图的桶上限(秒)
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class StageMetrics:
+    """各分析阶段耗时的直方图统计
+
+    用stage()上下文或timed()装饰器记录耗时, render_prometheus()输出
+    Prometheus文本格式。enabled为False时只多一次属性判断。
+    在begin_request()和end_request()之间, 当前线程内的阶段耗时还会按名称累加,
+    用于生成Server-Timing响应头。
+    多进程批量分析时, 工作进程中的阶段记录在各自的进程内, 不会汇总到这里。
+    """
+
+    def __init__(self, enabled=True, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._histograms = {}  # 阶段名 -> [各桶计数, 总耗时, 次数]
+        self._local = threading.local()
+
+    def observe(self, name, seconds):
+        """记录一次阶段耗时"""
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                histogram[0][index] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+        spans = getattr(self._local, "spans", None)
+        if spans is not None:
+            spans[name] = spans.get(name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        """记录with块的耗时"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timed(self, name=None):
+        """记录函数每次调用耗时的装饰器, 默认以函数名作为阶段名"""
+
+        def decorator(func):
+            stage_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(stage_name, time.perf_counter() - start)
+
+            return wrapper
+
+        return decorator
+
+    def begin_request(self):
+        """开始收集当前线程的阶段耗时"""
+        self._local.spans = {}
+
+    def end_request(self):
+        """结束收集, 返回{阶段名: 累计耗时(秒)}"""
+        spans = getattr(self._local, "spans", None) or {}
+        self._local.spans = None
+        return spans
+
+    @staticmethod
+    def server_timing(spans):
+        """Server-Timing响应头的值, 耗时单位为毫秒"""
+        return ", ".join(
+            f"{name};dur={seconds * 1000:.2f}" for name, seconds in spans.items()
+        )
+
+    def render_prometheus(self, metric="ecg_stage_duration_seconds"):
+        """Prometheus文本格式的直方图"""
+        with self._lock:
+            snapshot = {
+                name: (list(counts), total, count)
+                for name, (counts, total, count) in self._histograms.items()
+            }
+
+        lines = [
+            f"# HELP {metric} Duration of ECG analysis stages in seconds.",
+            f"# TYPE {metric} histogram",
+        ]
+        for name in sorted(snapshot):
+            counts, total, count = snapshot[name]
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{{stage="{name}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{stage="{name}",le="+Inf"}} {count}')
+            lines.append(f'{metric}_sum{{stage="{name}"}} {total:.6f}')
+            lines.append(f'{metric}_count{{stage="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+# 进程内共享的统计实例
+stage_metrics = StageMetrics()
+timed = stage_metrics.timed
@@ -0,0 +1,117 @@
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    """后台任务, 记录状态、进度和结果"""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, kind, key):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.status = Job.PENDING
+        self.progress = {"done": 0, "total": 0, "current": None}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._finished = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in (Job.DONE, Job.FAILED)
+
+    def update_progress(self, done, total, current=None):
+        """供任务函数调用, 报告已完成/总文件数和当前文件"""
+        self.progress = {"done": done, "total": total, "current": current}
+
+    def wait(self, timeout=None):
+        """等待任务结束, 超时返回False"""
+        return self._finished.wait(timeout)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """进程内的后台任务队列
+
+    相同key的任务在运行中或已成功完成时直接复用, 并发的相同请求只计算一次;
+    已结束的任务最多保留max_finished个, 超出后丢弃最早的。
+    """
+
+    def __init__(self, max_workers=2, max_finished=100):
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ecg-job"
+        )
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()  # job_id -> Job
+        self._by_key = {}  # key -> job_id
+
+    def submit(self, kind, key, func, *args, **kwargs):
+        """提交任务, 返回(任务, 是否新建)
+
+        func以progress=Job.update_progress关键字参数被调用, 返回值作为任务结果。
+        """
+        with self._lock:
+            job_id = self._by_key.get(key)
+            job = self._jobs.get(job_id) if job_id else None
+            if job is not None and job.status != Job.FAILED:
+                return job, False
+
+            job = Job(kind, key)
+            self._jobs[job.id] = job
+            self._by_key[key] = job.id
+            self._trim()
+
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job, True
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def find(self, key):
+        """按key查找任务"""
+        with self._lock:
+            job_id = self._by_key.get(key)
+            return self._jobs.get(job_id) if job_id else None
+
+    def _run(self, job, func, args, kwargs):
+        job.status = Job.RUNNING
+        try:
+            job.result = func(*args, progress=job.update_progress, **kwargs)
+            job.status = Job.DONE
+        except Exception as e:
+            traceback.print_exc()
+            job.error = str(e)
+            job.status = Job.FAILED
+        finally:
+            job.finished_at = time.time()
+            job._finished.set()
+
+    def _trim(self):
+        """丢弃最早的已结束任务, 只保留max_finished个"""
+        finished = [job for job in self._jobs.values() if job.finished]
+        for job in finished[: max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job.id]
+            if self._by_key.get(job.key) == job.id:
+                del self._by_key[job.key]
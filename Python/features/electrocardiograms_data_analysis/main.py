@@ -1,88 +1,237 @@
-import base64
+import hashlib
+import json
+import multiprocessing
 import os
 import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from functools import lru_cache
 from io import BytesIO
 
-# Made matplotlib using Qt6 backend
-import matplotlib
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
-from flask import Flask, render_template, request, jsonify
+from flask import (
+    Flask,
+    abort,
+    g,
+    jsonify,
+    render_template,
+    request,
+    send_file,
+    url_for,
+)
 from scipy import signal
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import StandardScaler
-from sklearn.ensemble import IsolationForest
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
 import warnings
 
+from analysis_result import AnalysisResult, SignalHandle
+from anomaly_stream import StreamingAnomalyDetector
+from batch_metrics import batch_rhythm_metrics, metrics_records, ragged_from_arrays
+from beat_classifier import classify_beats, count_labels
+from ecg_filters import butter_sos
+from ecg_loader import load_ecg, parse_sampling_rate, read_ecg_header, write_sidecar
+from ecg_upload import (
+    BinaryStreamParser,
+    CSVStreamParser,
+    UploadTooLarge,
+    file_sha256,
+    receive_upload,
+    write_ecg_csv,
+)
+from holter import ChunkedECGProcessor, open_recording
+from hrv import extended_hrv_metrics
+from instrumentation import stage_metrics, timed
+from jobs import Job, JobManager
+from metrics_store import MetricsStore
+from model_store import ModelStore, extends
+from plot_store import PlotStore
+from result_cache import ResultCache
+from signal_lod import SignalPyramid, minmax_indices
+from streaming_detector import StreamingPeakDetector
+
 warnings.filterwarnings("ignore")
 
-matplotlib.use("Agg")  # 使用非交互式后端
+app = Flask(__name__)
+
+# 数据、结果和缓存目录, 可用环境变量覆盖(默认相对于当前工作目录)
+DATA_DIR = os.environ.get("ECG_DATA_DIR", "data")
+RESULTS_DIR = os.environ.get("ECG_RESULTS_DIR", "results")
+CACHE_DIR = os.environ.get("ECG_CACHE_DIR", "cache")
+PLOTS_DIR = os.path.join(RESULTS_DIR, "plots")
 
-# MacOS特定的字体设置
-if sys.platform == "darwin":  # MacOS
-    plt.rcParams["font.sans-serif"] = ["Arial Unicode MS"]
-else:
-    plt.rcParams["font.sans-serif"] = ["SimHei"]
-plt.rcParams["axes.unicode_minus"] = False
+# 内容寻址的图像文件内容不会改变, 允许浏览器缓存一年
+PLOT_MAX_AGE = 365 * 24 * 3600
 
-app = Flask(__name__)
+# 批量分析使用的进程数, 为1时在当前进程中逐个分析
+ANALYSIS_WORKERS = os.cpu_count() or 1
+
+# 分析进程池的启动方式: 服务进程中有请求线程和后台任务线程, fork可能复制被其他线程
+# 持有的锁(例如阶段耗时统计的锁), 子进程会永久阻塞; 使用forkserver, 不支持时使用spawn
+POOL_START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+# 同时运行的后台任务数
+JOB_WORKERS = 2
+
+# 分析算法版本, 修改分析逻辑后递增以使旧缓存失效
+ANALYSIS_VERSION = 8
+
+# Holt-Winters预测至少需要两个完整周期(7天)的历史, 不足时使用直线外推
+FORECAST_MIN_HISTORY = 14
+
+# 多分辨率金字塔文件的扩展名, 与分析结果缓存条目一起保存和淘汰
+LOD_SUFFIX = ".lod.npy"
+# 金字塔的元数据文件(见SignalPyramid.meta_path)同样登记为附带文件
+LOD_META_SUFFIX = ".lod.json"
+
+# 信号浏览接口的默认像素宽度和上限
+SIGNAL_DEFAULT_WIDTH = 1000
+SIGNAL_MAX_WIDTH = 10000
+
+# 阶段耗时统计(/metrics), 设置ECG_STAGE_METRICS=0关闭
+STAGE_METRICS_ENABLED = os.environ.get("ECG_STAGE_METRICS", "1") != "0"
+
+# 设置ECG_SERVER_TIMING=1时在响应中附加Server-Timing头
+SERVER_TIMING_ENABLED = os.environ.get("ECG_SERVER_TIMING") == "1"
+stage_metrics.enabled = STAGE_METRICS_ENABLED
+
+# 比较页面记录表格的默认每页条数和上限
+COMPARE_PAGE_SIZE = 50
+COMPARE_MAX_PAGE_SIZE = 500
+
+# 比较页面列出的最近异常记录数
+COMPARE_RECENT_ANOMALIES = 10
+
+# 健康等级, 与evaluate_health_status的返回值一致
+HEALTH_LEVELS = ("Good", "Fair", "Poor")
+
+# 上传记录的大小上限
+UPLOAD_MAX_BYTES = 1 << 30
+
+# 上传记录的最短时长(秒), 过短的记录无法滤波和检测R峰
+UPLOAD_MIN_SECONDS = 10
+
+# 二进制上传的record_date参数格式, 与Apple Health导出的记录日期一致
+UPLOAD_DATE_FORMAT = "%Y-%m-%d %H:%M:%S %z"
+
+# 上传记录保存到数据目录时的文件名前缀, 后接内容哈希的前16位
+UPLOAD_PREFIX = "upload_"
+
+# 支持的图像格式及其MIME类型
+PLOT_FORMATS = {"png": "image/png", "webp": "image/webp", "svg": "image/svg+xml"}
+
+
+@lru_cache(maxsize=None)
+def _matplotlib():
+    """首次绘图时导入matplotlib并设置字体, 不绘图的进程不承担导入开销"""
+    import matplotlib
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    # MacOS特定的字体设置
+    if sys.platform == "darwin":  # MacOS
+        matplotlib.rcParams["font.sans-serif"] = ["Arial Unicode MS"]
+    else:
+        matplotlib.rcParams["font.sans-serif"] = ["SimHei"]
+    matplotlib.rcParams["axes.unicode_minus"] = False
+    return Figure, FigureCanvasAgg
+
+
+def new_figure(figsize):
+    """创建绑定Agg画布的图表
+
+    不经过pyplot, 图表不登记到全局的图表管理器, 各线程可以同时绘图;
+    图表不再被引用后随垃圾回收释放, 不需要close。
+    """
+    Figure, FigureCanvasAgg = _matplotlib()
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+@timed()
+def render_figure(fig, plot_format, dpi):
+    """把图表渲染为图像字节"""
+    img_data = BytesIO()
+    # SVG默认写入创建日期, 去掉后相同的图表总是得到相同的字节
+    metadata = {"Date": None} if plot_format == "svg" else None
+    fig.savefig(img_data, format=plot_format, dpi=dpi, metadata=metadata)
+    return img_data.getvalue()
 
 
 class ECGAnalyzer:
-    def __init__(self):
-        self.sampling_rate = 510.852  # 从文件中读取的采样率
+    def __init__(
+        self,
+        result_cache=None,
+        sidecar_dir=None,
+        plot_store=None,
+        plot_format="png",
+        plot_dpi=100,
+        model_store=None,
+    ):
+        if plot_format not in PLOT_FORMATS:
+            raise ValueError(f"不支持的图像格式: {plot_format}")
+        self.sampling_rate = 510.852  # 默认采样率, 文件头中没有采样率时使用
+        self.result_cache = result_cache  # 分析结果缓存, 为None时不缓存
+        self.sidecar_dir = sidecar_dir  # 二进制侧车文件目录, 为None时每次解析CSV
+        self.plot_store = plot_store  # 分析图像存储, 为None时不绘图
+        self.plot_format = plot_format  # 分析图像格式: png/webp/svg
+        self.plot_dpi = plot_dpi  # 分析图像分辨率
+        self.model_store = model_store  # 预测模型存储, 为None时每次重新拟合
+
+    def analysis_params(self):
+        """影响分析结果的参数, 作为缓存键的一部分"""
+        return {
+            "version": ANALYSIS_VERSION,
+            "sampling_rate": self.sampling_rate,
+            "plots": self.plot_store is not None,
+            "plot_format": self.plot_format,
+            "plot_dpi": self.plot_dpi,
+        }
 
+    def read_header(self, file_path):
+        """读取文件头信息"""
+        return read_ecg_header(file_path)
+
+    @timed()
     def load_data(self, file_path):
         """加载ECG数据文件"""
         try:
-            # 读取文件头信息
-            with open(file_path, "r", encoding="utf-8") as f:
-                header = {}
-                for i in range(10):  # 读取前10行作为头信息
-                    line = f.readline().strip()
-                    if "," in line:
-                        key, value = line.split(",", 1)
-                        header[key] = value.strip('"')
-
-            # 读取数值数据
-            data = pd.read_csv(file_path, skiprows=12, header=None)
-            return header, data[0].values
+            return load_ecg(file_path, self.sidecar_dir)
         except Exception as e:
             print(f"读取文件 {file_path} 时出错: {str(e)}")
             return None, None
 
-    def process_signal(self, data):
+    @timed()
+    def process_signal(self, data, sampling_rate=None):
         """信号处理"""
+        fs = sampling_rate or self.sampling_rate
         # 去基线漂移
-        b, a = signal.butter(3, 0.5 / (self.sampling_rate / 2), "highpass")
-        data_filtered = signal.filtfilt(b, a, data)
+        data_filtered = signal.sosfiltfilt(butter_sos(3, 0.5, fs, "highpass"), data)
 
         # 去高频噪声
-        b, a = signal.butter(3, 40 / (self.sampling_rate / 2), "lowpass")
-        data_filtered = signal.filtfilt(b, a, data_filtered)
+        data_filtered = signal.sosfiltfilt(
+            butter_sos(3, 40.0, fs, "lowpass"), data_filtered
+        )
 
         return data_filtered
 
-    def detect_peaks(self, data):
+    @timed()
+    def detect_peaks(self, data, sampling_rate=None):
         """检测R峰，使用改进的算法"""
+        fs = sampling_rate or self.sampling_rate
         # 使用Pan-Tompkins算法的改进版本
         # 1. 带通滤波
-        lowcut = 5.0
-        highcut = 15.0
-        nyquist = self.sampling_rate / 2
-        low = lowcut / nyquist
-        high = highcut / nyquist
-        b, a = signal.butter(3, [low, high], btype="band")
-        filtered = signal.filtfilt(b, a, data)
+        filtered = signal.sosfiltfilt(butter_sos(3, (5.0, 15.0), fs, "bandpass"), data)
 
         # 2. 求导
         diff = np.diff(filtered)
         squared = diff * diff
 
         # 3. 移动平均
-        window_size = int(0.1 * self.sampling_rate)
+        window_size = int(0.1 * fs)
         window = np.ones(window_size) / window_size
         smoothed = np.convolve(squared, window, mode="same")
 
@@ -90,17 +239,44 @@ class ECGAnalyzer:
         peaks, _ = signal.find_peaks(
             smoothed,
             height=0.3 * np.max(smoothed),
-            distance=int(0.2 * self.sampling_rate),
+            distance=int(0.2 * fs),
         )
         return peaks
 
-    def calculate_heart_rate(self, peaks):
+    @timed()
+    def analyze_holter(
+        self, npy_path, work_dir, sampling_rate=None, header=None, **kwargs
+    ):
+        """分块分析内存映射的长时程多导联记录, 每个导联返回一个AnalysisResult
+
+        结果中处理后的信号是work_dir中文件的内存映射, work_dir由调用方创建,
+        不再使用结果后由调用方删除(命令行入口见holter_analyze.py)。
+        其余参数(chunk_seconds, pad_seconds)传给ChunkedECGProcessor。
+        """
+        header = header or {}
+        fs = sampling_rate or parse_sampling_rate(header) or self.sampling_rate
+        name = os.path.splitext(os.path.basename(npy_path))[0]
+        processor = ChunkedECGProcessor(self, fs, work_dir=work_dir, **kwargs)
+        return processor.analyze(open_recording(npy_path), name=name, header=header)
+
+    def create_stream_detector(self, sampling_rate=None):
+        """创建流式R峰检测器, 用于逐块输入的实时数据"""
+        return StreamingPeakDetector(sampling_rate or self.sampling_rate)
+
+    def rr_intervals(self, peaks, sampling_rate=None):
+        """RR间期(ms), 可传给各指标方法的rr_intervals参数以避免重复计算"""
+        fs = sampling_rate or self.sampling_rate
+        return np.diff(peaks) / fs * 1000
+
+    @timed()
+    def calculate_heart_rate(self, peaks, sampling_rate=None, rr_intervals=None):
         """计算心率"""
         if len(peaks) < 2:  # 如果检测到的峰值少于2个
             return {"mean_hr": 0, "min_hr": 0, "max_hr": 0, "std_hr": 0}
 
-        rr_intervals = np.diff(peaks) / self.sampling_rate  # 转换为秒
-        heart_rates = 60 / rr_intervals  # 转换为每分钟心跳次数
+        if rr_intervals is None:
+            rr_intervals = self.rr_intervals(peaks, sampling_rate)
+        heart_rates = 60000 / rr_intervals  # 转换为每分钟心跳次数
 
         # 移除异常值
         heart_rates = heart_rates[(heart_rates >= 40) & (heart_rates <= 200)]
@@ -115,19 +291,21 @@ class ECGAnalyzer:
             "std_hr": np.std(heart_rates),
         }
 
-    def calculate_hrv_metrics(self, peaks):
+    @timed()
+    def calculate_hrv_metrics(self, peaks, sampling_rate=None, rr_intervals=None):
         """计算心率变异性指标"""
         if len(peaks) < 2:
-            return {"sdnn": 0, "rmssd": 0, "pnn50": 0}
+            return {"sdnn": 0, "rmssd": 0, "pnn50": 0, **extended_hrv_metrics([])}
 
         # 计算RR间期(ms)
-        rr_intervals = np.diff(peaks) / self.sampling_rate * 1000
+        if rr_intervals is None:
+            rr_intervals = self.rr_intervals(peaks, sampling_rate)
 
         # 过滤异常值
         rr_intervals = rr_intervals[(rr_intervals >= 300) & (rr_intervals <= 2000)]
 
         if len(rr_intervals) < 2:
-            return {"sdnn": 0, "rmssd": 0, "pnn50": 0}
+            return {"sdnn": 0, "rmssd": 0, "pnn50": 0, **extended_hrv_metrics([])}
 
         # SDNN: RR间期的标准差
         sdnn = np.std(rr_intervals)
@@ -139,14 +317,33 @@ class ECGAnalyzer:
         diff_rr = np.abs(np.diff(rr_intervals))
         pnn50 = 100 * np.sum(diff_rr > 50) / len(diff_rr)
 
-        return {"sdnn": sdnn, "rmssd": rmssd, "pnn50": pnn50}
+        # 频域(LF/HF)、Poincaré和样本熵
+        return {
+            "sdnn": sdnn,
+            "rmssd": rmssd,
+            "pnn50": pnn50,
+            **extended_hrv_metrics(rr_intervals),
+        }
+
+    @timed()
+    def classify_beats(self, data, peaks, sampling_rate=None):
+        """按与中位数模板的相关性标记每个心搏, 返回与peaks等长的标签数组"""
+        fs = sampling_rate or self.sampling_rate
+        return classify_beats(data, peaks, fs)
+
+    @timed()
+    def detect_arrhythmia(
+        self, peaks, sampling_rate=None, rr_intervals=None, beat_labels=None
+    ):
+        """检测可能的心律失常
 
-    def detect_arrhythmia(self, peaks):
-        """检测可能的心律失常"""
+        beat_labels为classify_beats的结果, 提供时同时报告形态异常的心搏。
+        """
         if len(peaks) < 2:
             return []
 
-        rr_intervals = np.diff(peaks) / self.sampling_rate * 1000
+        if rr_intervals is None:
+            rr_intervals = self.rr_intervals(peaks, sampling_rate)
         mean_rr = np.mean(rr_intervals)
         std_rr = np.std(rr_intervals)
 
@@ -164,56 +361,116 @@ class ECGAnalyzer:
         if std_rr > 150:
             anomalies.append("可能存在心率不齐")
 
+        # 检测形态异常的心搏
+        if beat_labels is not None:
+            anomalies.extend(self.beat_label_warnings(beat_labels))
+
         return anomalies
 
-    def analyze_trend(self, data, peaks):
-        """分析ECG信号趋势"""
+    @staticmethod
+    def beat_label_warnings(beat_labels):
+        """由心搏分类结果得到的心律失常提示"""
+        n_pvc = count_labels(beat_labels)["pvc"]
+        return [f"可能存在室性早搏({n_pvc}次)"] if n_pvc else []
+
+    @timed()
+    def batch_metrics(
+        self, peak_arrays, sampling_rates=None, extended=False, beat_labels=None
+    ):
+        """一次向量化计算多个记录的心率、HRV和心律失常指标
+
+        peak_arrays为R峰数组列表, sampling_rates为标量或每个记录一个值;
+        extended为True时同时计算频域和非线性HRV指标(逐个记录计算)。
+        beat_labels为每个记录的心搏分类结果, 提供时与detect_arrhythmia一样报告室早。
+        返回与peak_arrays对应的(heart_rate_stats, hrv_metrics, arrhythmia_warnings)列表。
+        """
+        if sampling_rates is None:
+            sampling_rates = self.sampling_rate
+        values, offsets = ragged_from_arrays(peak_arrays)
+        records = metrics_records(
+            batch_rhythm_metrics(values, offsets, sampling_rates, extended=extended)
+        )
+        if beat_labels is not None:
+            for (_, _, warnings), labels in zip(records, beat_labels):
+                warnings.extend(self.beat_label_warnings(labels))
+        return records
+
+    @timed()
+    def windowed_heart_rate(self, peaks, n_samples, window_seconds, sampling_rate=None):
+        """按固定时长窗口统计心率, 返回(窗口起始时间, 心率)
+
+        一次bincount统计所有窗口内的R峰数量, 少于2个R峰的窗口被跳过。
+        """
+        fs = sampling_rate or self.sampling_rate
+        window_size = int(window_seconds * fs)
+        n_windows = n_samples // window_size if window_size > 0 else 0
+        if n_windows == 0:
+            return np.empty(0), np.empty(0)
+
+        peaks = np.asarray(peaks)
+        peaks = peaks[(peaks >= 0) & (peaks < n_windows * window_size)]
+        counts = np.bincount(peaks // window_size, minlength=n_windows)
+
+        valid = counts >= 2
+        heart_rates = 60 * counts[valid] / (window_size / fs)
+        times = np.flatnonzero(valid) * window_size / fs
+        return times, heart_rates
+
+    @timed()
+    def analyze_trend(self, data, peaks, sampling_rate=None, heart_rates=None):
+        """分析ECG信号趋势
+
+        heart_rates为预先计算的30秒窗口心率, 为None时在此计算。
+        """
+        fs = sampling_rate or self.sampling_rate
         if len(peaks) < 2:
             return None
 
         # 计算每个窗口的心率
-        window_size = int(30 * self.sampling_rate)  # 30秒窗口
-        n_windows = len(data) // window_size
-        heart_rates = []
-
-        for i in range(n_windows):
-            start = i * window_size
-            end = (i + 1) * window_size
-            window_peaks = peaks[(peaks >= start) & (peaks < end)]
-            if len(window_peaks) >= 2:
-                hr = 60 * len(window_peaks) / (window_size / self.sampling_rate)
-                heart_rates.append(hr)
+        if heart_rates is None:
+            _, heart_rates = self.windowed_heart_rate(
+                peaks, len(data), 30, sampling_rate=fs
+            )
 
         if len(heart_rates) < 2:
             return None
 
-        # 线性回归分析趋势
-        X = np.arange(len(heart_rates)).reshape(-1, 1)
-        y = np.array(heart_rates)
-        model = LinearRegression()
-        model.fit(X, y)
+        # 线性回归分析趋势(最小二乘闭式解, 自变量中心化)
+        y = np.asarray(heart_rates, dtype=float)
+        x = np.arange(len(y)) - (len(y) - 1) / 2
+        deviation = y - y.mean()
+        slope = float(x @ deviation / (x @ x))
+        residual = deviation - slope * x
+        total = deviation @ deviation
+        r2_score = float(1 - residual @ residual / total) if total > 0 else 1.0
 
         trend = {
-            "slope": model.coef_[0],
+            "slope": slope,
             "trend_description": (
-                "上升"
-                if model.coef_[0] > 0.1
-                else "下降" if model.coef_[0] < -0.1 else "平稳"
+                "上升" if slope > 0.1 else "下降" if slope < -0.1 else "平稳"
             ),
-            "r2_score": model.score(X, y),
+            "r2_score": r2_score,
         }
 
         return trend
 
-    def plot_ecg(self, data, peaks, file_name, save_path):
-        """绘制ECG分析的详细可视化图"""
+    @timed()
+    def plot_ecg(self, data, peaks, file_name, sampling_rate=None, window_rates=None):
+        """绘制ECG分析的详细可视化图, 返回图像字节
+
+        window_rates为预先计算的10秒窗口心率(时间, 心率), 为None时在此计算。
+        """
+        fs = sampling_rate or self.sampling_rate
+        fig = new_figure((15, 12))
+
         # 1. ECG原始信号和R峰检测
-        ax1 = plt.subplot(3, 1, 1)
-        time = np.arange(len(data)) / self.sampling_rate
-        ax1.plot(time, data, "b-", label="ECG信号", linewidth=1)
+        # 按图像宽度的像素数做最小/最大值包络抽取, 外观不变但绘制点数大幅减少
+        ax1 = fig.add_subplot(3, 1, 1)
+        shown = minmax_indices(data, int(fig.get_figwidth() * self.plot_dpi))
+        ax1.plot(shown / fs, data[shown], "b-", label="ECG信号", linewidth=1)
         if len(peaks) > 0:
             ax1.plot(
-                peaks / self.sampling_rate, data[peaks], "ro", label="R峰", markersize=4
+                peaks / fs, data[peaks], "ro", label="R峰", markersize=4
             )
         ax1.set_xlabel("时间 (秒)")
         ax1.set_ylabel("幅值 (µV)")
@@ -222,10 +479,10 @@ class ECGAnalyzer:
         ax1.grid(True)
 
         # 2. RR间期变化图
-        ax2 = plt.subplot(3, 1, 2)
+        ax2 = fig.add_subplot(3, 1, 2)
         if len(peaks) >= 2:
-            rr_intervals = np.diff(peaks) / self.sampling_rate * 1000  # 转换为毫秒
-            rr_times = peaks[1:] / self.sampling_rate
+            rr_intervals = np.diff(peaks) / fs * 1000  # 转换为毫秒
+            rr_times = peaks[1:] / fs
             ax2.plot(rr_times, rr_intervals, "g-", label="RR间期", linewidth=1)
             ax2.axhline(
                 y=np.mean(rr_intervals), color="r", linestyle="--", label="平均值"
@@ -245,24 +502,16 @@ class ECGAnalyzer:
         ax2.grid(True)
 
         # 3. 心率变化趋势
-        ax3 = plt.subplot(3, 1, 3)
+        ax3 = fig.add_subplot(3, 1, 3)
         if len(peaks) >= 2:
             # 计算每个窗口的心率
-            window_size = int(10 * self.sampling_rate)  # 10秒窗口
-            n_windows = len(data) // window_size
-            heart_rates = []
-            times = []
-
-            for i in range(n_windows):
-                start = i * window_size
-                end = (i + 1) * window_size
-                window_peaks = peaks[(peaks >= start) & (peaks < end)]
-                if len(window_peaks) >= 2:
-                    hr = 60 * len(window_peaks) / (window_size / self.sampling_rate)
-                    heart_rates.append(hr)
-                    times.append(start / self.sampling_rate)
-
-            if heart_rates:
+            if window_rates is None:
+                window_rates = self.windowed_heart_rate(
+                    peaks, len(data), 10, sampling_rate=fs
+                )
+            times, heart_rates = window_rates
+
+            if len(heart_rates):
                 # 绘制心率变化
                 ax3.plot(times, heart_rates, "b-", label="瞬时心率", linewidth=1)
 
@@ -291,14 +540,76 @@ class ECGAnalyzer:
         ax3.grid(True)
 
         # 调整子图间距
-        plt.tight_layout()
+        fig.tight_layout()
 
-        # 保存图像
-        plt.savefig(save_path, dpi=300, bbox_inches="tight")
-        plt.close()
+        return render_figure(fig, self.plot_format, self.plot_dpi)
+
+    @timed()
+    def save_plot(self, data, peaks, file_name, sampling_rate=None, window_rates=None):
+        """绘图并保存到图像存储, 返回内容寻址的文件名; 未配置图像存储时返回None"""
+        if self.plot_store is None:
+            return None
+        img_bytes = self.plot_ecg(
+            data,
+            peaks,
+            file_name,
+            sampling_rate=sampling_rate,
+            window_rates=window_rates,
+        )
+        return self.plot_store.save(img_bytes, self.plot_format)
+
+    @timed()
+    def analyze_file(self, file_path, use_cache=True):
+        """分析单个文件, 结果按文件内容和分析参数缓存"""
+        if not use_cache or self.result_cache is None:
+            return self._analyze_file(file_path)
 
-    def analyze_file(self, file_path):
-        """分析单个文件"""
+        try:
+            key = self.result_cache.key_for(
+                file_path, "analysis", self.analysis_params()
+            )
+        except OSError as e:
+            print(f"读取文件 {file_path} 时出错: {str(e)}")
+            return None
+
+        result = self.result_cache.get(key)
+        if result is not None:
+            # 图像文件被删除时根据缓存的信号数据重新绘制
+            plot_name = result.plot_name
+            if plot_name and not self.plot_store.exists(plot_name):
+                try:
+                    signals = result.load_signals()
+                except OSError:
+                    signals = None
+                if signals is not None:
+                    result.plot_name = self.save_plot(
+                        signals["processed_data"],
+                        signals["peaks"],
+                        result.file_name,
+                        sampling_rate=result.sampling_rate,
+                    )
+                    self.result_cache.put(
+                        key, result, file_path=file_path, namespace="analysis"
+                    )
+                    return result
+            else:
+                return result
+
+        result = self._analyze_file(
+            file_path,
+            signal_path=self.result_cache.array_path(key),
+            pyramid_path=self._pyramid_path(key),
+        )
+        if result is not None:
+            self.result_cache.put(key, result, file_path=file_path, namespace="analysis")
+        return result
+
+    def _analyze_file(self, file_path, signal_path=None, pyramid_path=None):
+        """分析单个文件(不使用缓存)
+
+        signal_path不为None时信号数组保存到该.npz文件, 结果中只保留句柄;
+        pyramid_path不为None时同时保存处理后信号的多分辨率金字塔。
+        """
         file_name = os.path.basename(file_path)
         print(f"\n开始分析 {file_name}...")
 
@@ -307,127 +618,175 @@ class ECGAnalyzer:
         if header is None or data is None:
             return None
 
-        processed_data = self.process_signal(data)
-        peaks = self.detect_peaks(processed_data)
-        hr_stats = self.calculate_heart_rate(peaks)
-        hrv_metrics = self.calculate_hrv_metrics(peaks)
-        arrhythmia = self.detect_arrhythmia(peaks)
-        trend = self.analyze_trend(processed_data, peaks)
-
-        # 计算趋势分析数据
-        window_size = int(10 * self.sampling_rate)  # 10秒窗口
-        n_windows = len(processed_data) // window_size
-        heart_rates = []
-        times = []
-
-        for i in range(n_windows):
-            start = i * window_size
-            end = (i + 1) * window_size
-            window_peaks = peaks[(peaks >= start) & (peaks < end)]
-            if len(window_peaks) >= 2:
-                hr = 60 * len(window_peaks) / (window_size / self.sampling_rate)
-                heart_rates.append(hr)
-                times.append(start / self.sampling_rate)
+        # 使用文件头中的采样率, 缺失时使用默认值
+        fs = parse_sampling_rate(header) or self.sampling_rate
+
+        processed_data = self.process_signal(data, sampling_rate=fs)
+        peaks = self.detect_peaks(processed_data, sampling_rate=fs)
+        rr_intervals = self.rr_intervals(peaks, sampling_rate=fs)
+        hr_stats = self.calculate_heart_rate(peaks, rr_intervals=rr_intervals)
+        hrv_metrics = self.calculate_hrv_metrics(peaks, rr_intervals=rr_intervals)
+        beat_labels = self.classify_beats(processed_data, peaks, sampling_rate=fs)
+        arrhythmia = self.detect_arrhythmia(
+            peaks, rr_intervals=rr_intervals, beat_labels=beat_labels
+        )
+
+        # 窗口心率只计算一次, 供趋势分析和绘图共用
+        _, trend_rates = self.windowed_heart_rate(
+            peaks, len(processed_data), 30, sampling_rate=fs
+        )
+        times, heart_rates = self.windowed_heart_rate(
+            peaks, len(processed_data), 10, sampling_rate=fs
+        )
+        trend = self.analyze_trend(
+            processed_data, peaks, sampling_rate=fs, heart_rates=trend_rates
+        )
 
         if trend:
-            trend["times"] = times
-            trend["heart_rates"] = heart_rates
+            trend["times"] = times.tolist()
+            trend["heart_rates"] = heart_rates.tolist()
 
         # 保存图像
-        results_dir = "results"
-        os.makedirs(results_dir, exist_ok=True)
-        plot_path = os.path.join(results_dir, f"{file_name}_analysis.png")
-        self.plot_ecg(processed_data, peaks, file_name, plot_path)
+        plot_name = self.save_plot(
+            processed_data,
+            peaks,
+            file_name,
+            sampling_rate=fs,
+            window_rates=(times, heart_rates),
+        )
 
-        return {
-            "file_name": file_name,
-            "record_date": header.get("记录日期", "Unknown"),
-            "classification": header.get("分类", "Unknown"),
-            "heart_rate_stats": hr_stats,
-            "hrv_metrics": hrv_metrics,
-            "arrhythmia_warnings": arrhythmia,
-            "trend_analysis": trend,
-            "total_beats": len(peaks),
-            "duration": len(data) / self.sampling_rate,
-            "processed_data": processed_data,  # 添加处理后的数据
-            "peaks": peaks,  # 添加峰值数据
-            "raw_data": data,  # 添加原始数据
+        arrays = {
+            "raw_data": np.asarray(data),  # 原始数据
+            "processed_data": processed_data,  # 处理后的数据
+            "peaks": peaks,  # 峰值位置
+            "beat_labels": beat_labels,  # 心搏分类
         }
+        if pyramid_path is not None:
+            with stage_metrics.stage("build_pyramid"):
+                SignalPyramid.build(processed_data, fs).save(pyramid_path)
+        if signal_path is not None:
+            with stage_metrics.stage("save_signals"):
+                signals = SignalHandle.save(signal_path, **arrays)
+        else:
+            signals = SignalHandle(arrays=arrays)
+
+        return AnalysisResult(
+            file_name=file_name,
+            record_date=header.get("记录日期", "Unknown"),
+            classification=header.get("分类", "Unknown"),
+            sampling_rate=fs,
+            duration=len(data) / fs,
+            total_beats=len(peaks),
+            heart_rate_stats=hr_stats,
+            hrv_metrics=hrv_metrics,
+            arrhythmia_warnings=arrhythmia,
+            beat_counts=count_labels(beat_labels),
+            trend_analysis=trend,
+            plot_name=plot_name,
+            signals=signals,
+        )
+
+    def _pyramid_path(self, key):
+        """缓存条目对应的金字塔文件路径, 缓存未登记金字塔扩展名时返回None"""
+        if LOD_SUFFIX not in self.result_cache.attachment_suffixes:
+            return None
+        return self.result_cache.array_path(key, LOD_SUFFIX)
+
+    @timed()
+    def signal_pyramid(self, file_path):
+        """文件处理后信号的多分辨率金字塔
+
+        通常在分析时已经保存, 直接内存映射打开; 缺失时(例如较早的缓存条目)
+        由缓存的信号重新构建。文件无法分析时返回None。
+        """
+        pyramid_path = None
+        if self.result_cache is not None:
+            key = self.result_cache.key_for(
+                file_path, "analysis", self.analysis_params()
+            )
+            pyramid_path = self._pyramid_path(key)
+        if pyramid_path is not None:
+            try:
+                return SignalPyramid.open(pyramid_path)
+            except (OSError, ValueError):
+                pass
+
+        result = self.analyze_file(file_path)
+        if result is None:
+            return None
+        if pyramid_path is not None:
+            try:
+                return SignalPyramid.open(pyramid_path)
+            except (OSError, ValueError):
+                pass
+        pyramid = SignalPyramid.build(
+            result.load_signals()["processed_data"], result.sampling_rate
+        )
+        if pyramid_path is not None:
+            pyramid.save(pyramid_path)
+        return pyramid
 
+    @timed()
     def predict_future_trends(self, historical_results, days=7):
-        """预测未来趋势"""
+        """预测未来趋势
+
+        相同的心率序列直接使用模型存储中的预测值, 不重新拟合;
+        存储中只保存预测值, 日期等字段每次由当前的历史记录生成。
+        """
         if len(historical_results) < 3:
             return None
 
         # 提取时间序列数据
-        dates = [r["record_date"] for r in historical_results]
-        mean_hrs = [r["heart_rate_stats"]["mean_hr"] for r in historical_results]
-
-        # 使用Holt-Winters方法进行预测
-        model = ExponentialSmoothing(
-            mean_hrs, seasonal_periods=7, trend="add", seasonal="add"
-        )
-        fitted_model = model.fit()
-        forecast = fitted_model.forecast(days)
+        dates = [r.record_date for r in historical_results]
+        mean_hrs = [r.heart_rate_stats["mean_hr"] for r in historical_results]
+
+        # output区分只保存预测值的条目与早先保存整个结果的条目
+        key = ModelStore.key_for("forecast", mean_hrs, {"days": days, "output": "values"})
+        entry = self.model_store.get(key) if self.model_store else None
+        if entry is not None:
+            forecast = entry["output"]
+        else:
+            forecast, model = self._fit_forecast(np.asarray(mean_hrs, dtype=float), days)
+            forecast = forecast.tolist()
+            if self.model_store:
+                self.model_store.put(key, "forecast", mean_hrs, model, forecast)
 
         return {
             "dates": dates,
             "historical": mean_hrs,
-            "forecast": forecast.tolist(),
+            "forecast": forecast,
             "forecast_dates": [f"预测{i + 1}天" for i in range(days)],
         }
 
-    def detect_anomaly_patterns(self, historical_results):
-        """检测异常模式"""
-        if len(historical_results) < 3:
-            return []
-
-        # 准备特征数据
-        features = []
-        for result in historical_results:
-            features.append(
-                [
-                    result["heart_rate_stats"]["mean_hr"],
-                    result["heart_rate_stats"]["std_hr"],
-                    result["hrv_metrics"]["sdnn"],
-                    result["hrv_metrics"]["rmssd"],
-                ]
-            )
+    def _fit_forecast(self, series, days):
+        """拟合预测模型, 返回(预测值, 模型参数)"""
+        if len(series) < FORECAST_MIN_HISTORY:
+            # 不足两个周期时无法估计季节项, 使用最小二乘直线外推
+            slope, intercept = np.polyfit(np.arange(len(series)), series, 1)
+            return intercept + slope * np.arange(len(series), len(series) + days), None
 
-        # 标准化数据
-        scaler = StandardScaler()
-        features_scaled = scaler.fit_transform(features)
-
-        # 使用IsolationForest检测异常
-        iso_forest = IsolationForest(contamination=0.1, random_state=42)
-        predictions = iso_forest.fit_predict(features_scaled)
-
-        # 找出异常记录
-        anomalies = []
-        for i, pred in enumerate(predictions):
-            if pred == -1:
-                anomalies.append(
-                    {
-                        "date": historical_results[i]["record_date"],
-                        "metrics": {
-                            "mean_hr": historical_results[i]["heart_rate_stats"][
-                                "mean_hr"
-                            ],
-                            "sdnn": historical_results[i]["hrv_metrics"]["sdnn"],
-                            "warnings": historical_results[i]["arrhythmia_warnings"],
-                        },
-                    }
-                )
-
-        return anomalies
+        # 使用Holt-Winters方法进行预测, statsmodels只在比较分析时导入
+        from statsmodels.tsa.holtwinters import ExponentialSmoothing
 
+        model = ExponentialSmoothing(
+            series, seasonal_periods=7, trend="add", seasonal="add"
+        )
+        fit_kwargs = {}
+        previous = self.model_store.latest("forecast") if self.model_store else None
+        if previous and previous["model"] is not None and extends(previous["data"], series):
+            # 只追加了新记录时从上次的参数开始优化, 跳过网格搜索
+            fit_kwargs = {"start_params": previous["model"], "use_brute": False}
+        fitted_model = model.fit(**fit_kwargs)
+        return fitted_model.forecast(days), fitted_model.params_formatted["param"].to_numpy()
+
+    @timed()
     def evaluate_health_status(self, result):
         """评估健康状况"""
         score = 100  # 初始满分
         warnings = []
 
         # 心率评估
-        mean_hr = result["heart_rate_stats"]["mean_hr"]
+        mean_hr = result.heart_rate_stats["mean_hr"]
         if mean_hr < 60:
             score -= 10
             warnings.append("心率过低")
@@ -436,7 +795,7 @@ class ECGAnalyzer:
             warnings.append("心率过高")
 
         # HRV评估
-        sdnn = result["hrv_metrics"]["sdnn"]
+        sdnn = result.hrv_metrics["sdnn"]
         if sdnn < 20:
             score -= 15
             warnings.append("心率变异性过低")
@@ -444,10 +803,20 @@ class ECGAnalyzer:
             score -= 10
             warnings.append("心率变异性异常")
 
+        # 自主神经平衡与心率复杂度评估, 数据不足时这些指标为None, 不参与评分
+        lf_hf_ratio = result.hrv_metrics.get("lf_hf_ratio")
+        if lf_hf_ratio is not None and lf_hf_ratio > 3:
+            score -= 5
+            warnings.append("交感神经活动占优")
+        sample_entropy = result.hrv_metrics.get("sample_entropy")
+        if sample_entropy is not None and sample_entropy < 0.5:
+            score -= 5
+            warnings.append("心率复杂度降低")
+
         # 心律失常评估
-        if result["arrhythmia_warnings"]:
-            score -= 5 * len(result["arrhythmia_warnings"])
-            warnings.extend(result["arrhythmia_warnings"])
+        if result.arrhythmia_warnings:
+            score -= 5 * len(result.arrhythmia_warnings)
+            warnings.extend(result.arrhythmia_warnings)
 
         return {
             "score": max(0, score),  # 确保分数不小于0
@@ -457,15 +826,54 @@ class ECGAnalyzer:
 
 
 # 创建全局分析器实例
-analyzer = ECGAnalyzer()
+plot_store = PlotStore(PLOTS_DIR)
+analyzer = ECGAnalyzer(
+    result_cache=ResultCache(
+        os.path.join(CACHE_DIR, "results"),
+        attachment_suffixes=(".npz", LOD_SUFFIX, LOD_META_SUFFIX),
+    ),
+    sidecar_dir=os.path.join(CACHE_DIR, "sidecars"),
+    plot_store=plot_store,
+    model_store=ModelStore(os.path.join(CACHE_DIR, "models")),
+)
+metrics_store = MetricsStore(os.path.join(CACHE_DIR, "metrics.sqlite3"))
+job_manager = JobManager(max_workers=JOB_WORKERS)
+
+# 在线异常检测器的状态读-改-写需要串行
+_anomaly_lock = threading.Lock()
+
+
+@app.before_request
+def begin_server_timing():
+    if SERVER_TIMING_ENABLED and stage_metrics.enabled:
+        g.request_started = time.perf_counter()
+        stage_metrics.begin_request()
+
+
+@app.after_request
+def add_server_timing(response):
+    """把本次请求中各阶段的累计耗时写入Server-Timing响应头"""
+    if "request_started" in g:
+        spans = stage_metrics.end_request()
+        spans["total"] = time.perf_counter() - g.request_started
+        response.headers["Server-Timing"] = stage_metrics.server_timing(spans)
+    return response
+
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus格式的阶段耗时直方图"""
+    return app.response_class(
+        stage_metrics.render_prometheus(),
+        mimetype="text/plain; version=0.0.4",
+    )
 
 
 @app.route("/")
 def index():
     """主页"""
     # 获取data目录下的所有CSV文件
-    data_dir = "data"
-    ecg_files = [f for f in os.listdir(data_dir) if f.endswith(".csv")]
+    ecg_files = [f for f in os.listdir(DATA_DIR) if f.endswith(".csv")]
     return render_template("index.html", files=ecg_files)
 
 
@@ -476,196 +884,283 @@ def analyze():
     if not file_name:
         return jsonify({"error": "未选择文件"})
 
-    file_path = os.path.join("data", file_name)
+    file_path = os.path.join(DATA_DIR, file_name)
     try:
         # 分析数据
         result = analyzer.analyze_file(file_path)
         if not result:
             return jsonify({"error": "分析失败"})
+        sync_metrics_store(file_path, result)
+
+        return jsonify(format_analysis(result))
+
+    except Exception as e:
+        return jsonify({"error": str(e)})
+
 
-        # 生成图表
-        fig = create_analysis_plots(result)
-
-        # 将图表转换为base64字符串
-        img_data = BytesIO()
-        fig.savefig(img_data, format="png", dpi=300, bbox_inches="tight")
-        plt.close(fig)
-        img_data.seek(0)
-        img_base64 = base64.b64encode(img_data.getvalue()).decode()
-
-        # 准备返回数据
-        response_data = {
-            "plot": img_base64,
-            "analysis": {
-                "file_name": result["file_name"],
-                "record_date": result["record_date"],
-                "classification": result["classification"],
-                "duration": f"{result['duration']:.2f}秒",
-                "total_beats": result["total_beats"],
-                "heart_rate": {
-                    "mean": f"{result['heart_rate_stats']['mean_hr']:.1f}",
-                    "min": f"{result['heart_rate_stats']['min_hr']:.1f}",
-                    "max": f"{result['heart_rate_stats']['max_hr']:.1f}",
-                    "std": f"{result['heart_rate_stats']['std_hr']:.1f}",
-                },
-                "hrv_metrics": {
-                    "sdnn": f"{result['hrv_metrics']['sdnn']:.1f}",
-                    "rmssd": f"{result['hrv_metrics']['rmssd']:.1f}",
-                    "pnn50": f"{result['hrv_metrics']['pnn50']:.1f}",
-                },
-                "warnings": result["arrhythmia_warnings"],
-                "trend": (
-                    result["trend_analysis"]["trend_description"]
-                    if result["trend_analysis"]
-                    else None
-                ),
+def _format_optional(value, spec):
+    """格式化可能无法计算(None)的指标, 无法计算时显示N/A"""
+    return "N/A" if value is None else format(value, spec)
+
+
+def _current_plot_name(result):
+    """结果引用的分析图被图像存储淘汰时重新分析数据文件(命中缓存时只重新绘图),
+    返回仍存在的图像文件名
+
+    已完成任务和指标存储中的结果可能引用已删除的图像。
+    """
+    if result.plot_name and not plot_store.exists(result.plot_name):
+        fresh = analyzer.analyze_file(os.path.join(DATA_DIR, result.file_name))
+        result.plot_name = fresh.plot_name if fresh is not None else None
+    return result.plot_name
+
+
+def format_analysis(result):
+    """把单个文件的分析结果整理为/analyze的返回数据
+
+    图表在分析时已保存, 只返回其地址。
+    """
+    plot_name = _current_plot_name(result)
+    return {
+        "plot_url": url_for("plot_file", name=plot_name) if plot_name else None,
+        "analysis": {
+            "file_name": result.file_name,
+            "record_date": result.record_date,
+            "classification": result.classification,
+            "duration": f"{result.duration:.2f}秒",
+            "total_beats": result.total_beats,
+            "beat_counts": result.beat_counts,
+            "heart_rate": {
+                "mean": f"{result.heart_rate_stats['mean_hr']:.1f}",
+                "min": f"{result.heart_rate_stats['min_hr']:.1f}",
+                "max": f"{result.heart_rate_stats['max_hr']:.1f}",
+                "std": f"{result.heart_rate_stats['std_hr']:.1f}",
             },
-        }
+            "hrv_metrics": {
+                "sdnn": f"{result.hrv_metrics['sdnn']:.1f}",
+                "rmssd": f"{result.hrv_metrics['rmssd']:.1f}",
+                "pnn50": f"{result.hrv_metrics['pnn50']:.1f}",
+                "lf_power": _format_optional(result.hrv_metrics["lf_power"], ".1f"),
+                "hf_power": _format_optional(result.hrv_metrics["hf_power"], ".1f"),
+                "lf_hf_ratio": _format_optional(result.hrv_metrics["lf_hf_ratio"], ".2f"),
+                "sd1": f"{result.hrv_metrics['sd1']:.1f}",
+                "sd2": f"{result.hrv_metrics['sd2']:.1f}",
+                "sample_entropy": _format_optional(result.hrv_metrics["sample_entropy"], ".2f"),
+            },
+            "warnings": result.arrhythmia_warnings,
+            "anomaly": result.anomaly,
+            "trend": (
+                result.trend_analysis["trend_description"]
+                if result.trend_analysis
+                else None
+            ),
+        },
+    }
+
 
-        return jsonify(response_data)
+def _analyze_summary(file_path):
+    """分析单个文件并附加健康评估, 只返回摘要指标
 
+    在工作进程中执行, 信号数组不会传回父进程。分析出错时记录错误并返回None,
+    单个文件的错误不影响整批分析。
+    """
+    try:
+        result = analyzer.analyze_file(file_path)
+        if not result:
+            return None
+        result.health_evaluation = analyzer.evaluate_health_status(result)
     except Exception as e:
-        return jsonify({"error": str(e)})
+        print(f"分析文件 {file_path} 时出错: {str(e)}")
+        return None
+    result.signals = None
+    return result
 
 
-def create_analysis_plots(result):
-    """创建分析图表"""
-    fig = plt.figure(figsize=(15, 12))
-
-    # 1. ECG信号和R峰
-    ax1 = plt.subplot(311)
-    time = np.arange(len(result["processed_data"])) / analyzer.sampling_rate
-    ax1.plot(time, result["processed_data"], "b-", label="ECG信号", linewidth=1)
-    if len(result["peaks"]) > 0:
-        ax1.plot(
-            result["peaks"] / analyzer.sampling_rate,
-            result["processed_data"][result["peaks"]],
-            "ro",
-            label="R峰",
-            markersize=4,
-        )
-    ax1.set_xlabel("时间 (秒)")
-    ax1.set_ylabel("幅值 (µV)")
-    ax1.set_title("ECG信号分析")
-    ax1.legend()
-    ax1.grid(True)
+def record_analysis(file_name, file_state, params, result):
+    """把新的分析结果写入指标存储, 写入前由在线检测器判断该记录是否异常
 
-    # 2. RR间期
-    ax2 = plt.subplot(312)
-    if len(result["peaks"]) >= 2:
-        rr_intervals = np.diff(result["peaks"]) / analyzer.sampling_rate * 1000
-        rr_times = result["peaks"][1:] / analyzer.sampling_rate
-        ax2.plot(rr_times, rr_intervals, "g-", label="RR间期")
-        ax2.axhline(y=np.mean(rr_intervals), color="r", linestyle="--", label="平均值")
-        ax2.fill_between(
-            rr_times,
-            np.mean(rr_intervals) - np.std(rr_intervals),
-            np.mean(rr_intervals) + np.std(rr_intervals),
-            alpha=0.2,
-            color="r",
-            label="标准差范围",
+    检测器状态与指标存储一起持久化; 分析参数变化后所有记录会重新分析,
+    检测器也从空状态重新开始。
+    """
+    try:
+        content_sha256 = analyzer.result_cache.file_digest(
+            os.path.join(DATA_DIR, file_name)
         )
-    ax2.set_xlabel("时间 (秒)")
-    ax2.set_ylabel("RR间期 (ms)")
-    ax2.set_title("RR间期变化")
-    ax2.legend()
-    ax2.grid(True)
-
-    # 3. 心率趋势
-    ax3 = plt.subplot(313)
-    if result["trend_analysis"] and "times" in result["trend_analysis"]:
-        times = result["trend_analysis"]["times"]
-        heart_rates = result["trend_analysis"]["heart_rates"]
-        ax3.plot(times, heart_rates, "b-", label="瞬时心率")
-
-        if len(heart_rates) > 1:
-            z = np.polyfit(times, heart_rates, 1)
-            p = np.poly1d(z)
-            ax3.plot(times, p(times), "r--", label=f"趋势线 (斜率: {z[0]:.2f})")
-
-        ax3.axhline(y=60, color="g", linestyle=":", alpha=0.5)
-        ax3.axhline(y=100, color="g", linestyle=":", alpha=0.5)
-        ax3.fill_between(
-            [times[0], times[-1]], 60, 100, alpha=0.1, color="g", label="正常心率范围"
+    except OSError:
+        content_sha256 = None
+
+    with _anomaly_lock:
+        state = metrics_store.load_state("anomaly", params)
+        detector = (
+            StreamingAnomalyDetector.from_dict(state)
+            if state
+            else StreamingAnomalyDetector()
         )
+        result.anomaly = detector.update(result)
+        metrics_store.save_state("anomaly", params, detector.to_dict())
+        metrics_store.upsert(file_name, file_state, params, result, content_sha256)
 
-    ax3.set_xlabel("时间 (秒)")
-    ax3.set_ylabel("心率 (bpm)")
-    ax3.set_title("心率变化趋势")
-    ax3.legend()
-    ax3.grid(True)
 
-    plt.tight_layout()
-    return fig
+def sync_metrics_store(file_path, result):
+    """单个文件分析完成后与指标存储同步
 
+    存储中还没有这次的结果时写入(并由在线检测器标记), 否则取回已有的异常标记。
+    """
+    file_name = os.path.basename(file_path)
+    file_state = MetricsStore.file_state(file_path)
+    params = analyzer.analysis_params()
+    if metrics_store.stale_files({file_name: file_state}, params):
+        result.health_evaluation = analyzer.evaluate_health_status(result)
+        record_analysis(file_name, file_state, params, result)
+    else:
+        stored = metrics_store.get(file_name)
+        result.anomaly = stored.anomaly if stored else None
 
-def analyze_all_files():
-    """分析所有文件并生成比较报告"""
-    data_dir = "data"
-    ecg_files = [f for f in os.listdir(data_dir) if f.endswith(".csv")]
-    all_results = []
 
-    for file_name in ecg_files:
-        file_path = os.path.join(data_dir, file_name)
-        result = analyzer.analyze_file(file_path)
-        if result:
-            # 添加健康评估
-            result["health_evaluation"] = analyzer.evaluate_health_status(result)
-            all_results.append(result)
+def _record_date_key(file_path):
+    """按文件头中的记录日期排序, 读取失败的文件排在最后"""
+    try:
+        record_date = analyzer.read_header(file_path).get("记录日期", "")
+    except (OSError, UnicodeDecodeError):
+        record_date = ""
+    return (record_date == "", record_date, os.path.basename(file_path))
+
+
+def iter_analysis_summaries(file_paths, workers=None):
+    """批量分析文件, 按记录日期顺序逐个产出(文件路径, 摘要)
+
+    workers为工作进程数, 默认使用ANALYSIS_WORKERS; 分析失败的文件摘要为None。
+    """
+    file_paths = sorted(file_paths, key=_record_date_key)
+    workers = min(workers or ANALYSIS_WORKERS, len(file_paths))
+
+    if workers <= 1:
+        for file_path in file_paths:
+            yield file_path, _analyze_summary(file_path)
+        return
+
+    # 每个任务块包含多个文件, 减少进程间通信次数; map按提交顺序返回结果
+    chunksize = max(1, len(file_paths) // (workers * 4))
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context(POOL_START_METHOD),
+    ) as pool:
+        summaries = pool.map(_analyze_summary, file_paths, chunksize=chunksize)
+        yield from zip(file_paths, summaries)
+
+
+def data_file_states():
+    """data目录下所有CSV文件的{文件名: (mtime_ns, size)}"""
+    return {
+        f: MetricsStore.file_state(os.path.join(DATA_DIR, f))
+        for f in os.listdir(DATA_DIR)
+        if f.endswith(".csv")
+    }
+
+
+@timed()
+def analyze_all_files(workers=None, progress=None):
+    """分析所有文件并生成比较报告
+
+    progress(已完成数, 总数, 当前文件名)在每个需要分析的文件完成后被调用。
+    """
+    file_states = data_file_states()
+    ecg_files = list(file_states)
+    params = analyzer.analysis_params()
+
+    # 只分析新增或修改过的文件, 其余记录直接读取指标存储
+    stale_paths = [
+        os.path.join(DATA_DIR, f)
+        for f in metrics_store.stale_files(file_states, params)
+    ]
+    if progress:
+        progress(0, len(stale_paths))
+    summaries = iter_analysis_summaries(stale_paths, workers)
+    for done, (file_path, summary) in enumerate(summaries, 1):
+        file_name = os.path.basename(file_path)
+        if summary:
+            record_analysis(file_name, file_states[file_name], params, summary)
+        if progress:
+            progress(done, len(stale_paths), file_name)
+    metrics_store.prune(ecg_files)
 
     # 按日期排序
-    all_results.sort(key=lambda x: x["record_date"])
+    all_results = metrics_store.load_all()
 
     # 预测未来趋势
     future_prediction = analyzer.predict_future_trends(all_results)
 
-    # 检测异常模式
-    anomaly_patterns = analyzer.detect_anomaly_patterns(all_results)
+    # 异常记录: 由在线检测器在每条记录入库时标记
+    anomaly_patterns = [
+        {
+            "date": r.record_date,
+            "metrics": {
+                "mean_hr": r.heart_rate_stats["mean_hr"],
+                "sdnn": r.hrv_metrics["sdnn"],
+                "warnings": r.arrhythmia_warnings,
+                "flagged": r.anomaly["metrics"],
+            },
+        }
+        for r in all_results
+        if r.anomaly and r.anomaly["flagged"]
+    ]
 
     # 生成比较图表
-    comparison_plots = create_comparison_plots(all_results, future_prediction)
-
-    # 将图表转换为base64字符串
-    img_data = BytesIO()
-    comparison_plots.savefig(img_data, format="png", dpi=300, bbox_inches="tight")
-    plt.close(comparison_plots)
-    img_data.seek(0)
-    comparison_base64 = base64.b64encode(img_data.getvalue()).decode()
+    plot_name = save_comparison_plot(all_results, future_prediction)
 
     # 准备统计数据
     stats = {
         "total_records": len(all_results),
         "date_range": {
-            "start": all_results[0]["record_date"] if all_results else "N/A",
-            "end": all_results[-1]["record_date"] if all_results else "N/A",
+            "start": all_results[0].record_date if all_results else "N/A",
+            "end": all_results[-1].record_date if all_results else "N/A",
         },
         "heart_rate_trends": {
-            "mean": [r["heart_rate_stats"]["mean_hr"] for r in all_results],
-            "dates": [r["record_date"] for r in all_results],
+            "mean": [r.heart_rate_stats["mean_hr"] for r in all_results],
+            "dates": [r.record_date for r in all_results],
         },
         "hrv_trends": {
-            "sdnn": [r["hrv_metrics"]["sdnn"] for r in all_results],
-            "rmssd": [r["hrv_metrics"]["rmssd"] for r in all_results],
-            "pnn50": [r["hrv_metrics"]["pnn50"] for r in all_results],
+            "sdnn": [r.hrv_metrics["sdnn"] for r in all_results],
+            "rmssd": [r.hrv_metrics["rmssd"] for r in all_results],
+            "pnn50": [r.hrv_metrics["pnn50"] for r in all_results],
         },
-        "health_scores": [r["health_evaluation"]["score"] for r in all_results],
+        "health_scores": [r.health_evaluation["score"] for r in all_results],
         "anomalies": anomaly_patterns,
         "prediction": future_prediction,
     }
 
-    return all_results, comparison_base64, stats
+    return all_results, plot_name, stats
+
+
+def save_comparison_plot(results, future_prediction):
+    """绘制比较图表并保存为内容寻址的图像文件, 返回文件名"""
+    comparison_plots = create_comparison_plots(results, future_prediction)
+    return plot_store.save(
+        render_figure(comparison_plots, analyzer.plot_format, analyzer.plot_dpi),
+        analyzer.plot_format,
+    )
 
 
+def comparison_plot_name(job):
+    """已完成的比较任务的图表文件名, 图表被图像存储淘汰时重新绘制"""
+    all_results, plot_name, stats = job.result
+    if not plot_store.exists(plot_name):
+        plot_name = save_comparison_plot(all_results, stats["prediction"])
+        job.result = (all_results, plot_name, stats)
+    return plot_name
+
+
+@timed()
 def create_comparison_plots(results, future_prediction):
     """创建比较分析图表"""
-    fig = plt.figure(figsize=(15, 15))
+    fig = new_figure((15, 18))
 
     # 1. 心率趋势比较
-    ax1 = plt.subplot(411)
-    dates = [r["record_date"] for r in results]
-    mean_hrs = [r["heart_rate_stats"]["mean_hr"] for r in results]
-    min_hrs = [r["heart_rate_stats"]["min_hr"] for r in results]
-    max_hrs = [r["heart_rate_stats"]["max_hr"] for r in results]
+    ax1 = fig.add_subplot(5, 1, 1)
+    dates = [r.record_date for r in results]
+    mean_hrs = [r.heart_rate_stats["mean_hr"] for r in results]
+    min_hrs = [r.heart_rate_stats["min_hr"] for r in results]
+    max_hrs = [r.heart_rate_stats["max_hr"] for r in results]
 
     ax1.plot(dates, mean_hrs, "b-o", label="平均心率")
     ax1.fill_between(dates, min_hrs, max_hrs, alpha=0.2, color="b", label="心率范围")
@@ -674,13 +1169,13 @@ def create_comparison_plots(results, future_prediction):
     ax1.set_title("心率趋势变化")
     ax1.legend()
     ax1.grid(True)
-    plt.xticks(rotation=45)
+    ax1.tick_params(axis="x", labelrotation=45)
 
     # 2. HRV指标比较
-    ax2 = plt.subplot(412)
-    sdnn = [r["hrv_metrics"]["sdnn"] for r in results]
-    rmssd = [r["hrv_metrics"]["rmssd"] for r in results]
-    pnn50 = [r["hrv_metrics"]["pnn50"] for r in results]
+    ax2 = fig.add_subplot(5, 1, 2)
+    sdnn = [r.hrv_metrics["sdnn"] for r in results]
+    rmssd = [r.hrv_metrics["rmssd"] for r in results]
+    pnn50 = [r.hrv_metrics["pnn50"] for r in results]
 
     ax2.plot(dates, sdnn, "r-o", label="SDNN")
     ax2.plot(dates, rmssd, "g-o", label="RMSSD")
@@ -690,15 +1185,15 @@ def create_comparison_plots(results, future_prediction):
     ax2.set_title("心率变异性指标比较")
     ax2.legend()
     ax2.grid(True)
-    plt.xticks(rotation=45)
+    ax2.tick_params(axis="x", labelrotation=45)
 
     # 3. 异常检测统计
-    ax3 = plt.subplot(413)
+    ax3 = fig.add_subplot(5, 1, 3)
     warning_types = set()
     warning_counts = {}
 
     for r in results:
-        for warning in r["arrhythmia_warnings"]:
+        for warning in r.arrhythmia_warnings:
             if warning not in warning_types:
                 warning_types.add(warning)
                 warning_counts[warning] = [0] * len(results)
@@ -713,12 +1208,12 @@ def create_comparison_plots(results, future_prediction):
     ax3.set_ylabel("异常计数")
     ax3.set_title("异常检测统计")
     ax3.legend()
-    plt.xticks(rotation=45)
+    ax3.tick_params(axis="x", labelrotation=45)
 
     # 4. 总体统计
-    ax4 = plt.subplot(414)
-    total_beats = [r["total_beats"] for r in results]
-    durations = [r["duration"] for r in results]
+    ax4 = fig.add_subplot(5, 1, 4)
+    total_beats = [r.total_beats for r in results]
+    durations = [r.duration for r in results]
 
     ax4_twin = ax4.twinx()
     ax4.plot(dates, total_beats, "b-o", label="总心跳数")
@@ -732,40 +1227,413 @@ def create_comparison_plots(results, future_prediction):
     lines1, labels1 = ax4.get_legend_handles_labels()
     lines2, labels2 = ax4_twin.get_legend_handles_labels()
     ax4.legend(lines1 + lines2, labels1 + labels2, loc="upper left")
-    plt.xticks(rotation=45)
+    ax4.tick_params(axis="x", labelrotation=45)
 
     # 5. 未来趋势预测
-    ax5 = plt.subplot(415)
-    ax5.plot(
-        future_prediction["dates"],
-        future_prediction["forecast"],
-        "r-",
-        label="预测心率",
-    )
-    ax5.fill_between(
-        future_prediction["dates"],
-        future_prediction["forecast"] - np.std(future_prediction["forecast"]),
-        future_prediction["forecast"] + np.std(future_prediction["forecast"]),
-        alpha=0.2,
-        color="r",
-        label="预测范围",
-    )
+    ax5 = fig.add_subplot(5, 1, 5)
+    if future_prediction:
+        forecast = np.asarray(future_prediction["forecast"])
+        ax5.plot(
+            future_prediction["forecast_dates"],
+            forecast,
+            "r-",
+            label="预测心率",
+        )
+        ax5.fill_between(
+            future_prediction["forecast_dates"],
+            forecast - np.std(forecast),
+            forecast + np.std(forecast),
+            alpha=0.2,
+            color="r",
+            label="预测范围",
+        )
     ax5.set_xlabel("日期")
     ax5.set_ylabel("心率 (bpm)")
     ax5.set_title("未来心率趋势预测")
     ax5.legend()
     ax5.grid(True)
 
-    plt.tight_layout()
+    fig.tight_layout()
     return fig
 
 
+def _job_key(kind, payload):
+    """由任务类型、数据文件状态和分析参数生成任务去重键"""
+    payload = {"kind": kind, "params": analyzer.analysis_params(), **payload}
+    encoded = json.dumps(payload, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def submit_compare_job():
+    """提交比较分析任务, 数据未变化时复用已有任务"""
+    key = _job_key("compare", {"files": data_file_states()})
+    job, _ = job_manager.submit("compare", key, analyze_all_files)
+    return job
+
+
+def _analyze_job(file_path, progress):
+    progress(0, 1, os.path.basename(file_path))
+    result = analyzer.analyze_file(file_path)
+    if not result:
+        raise ValueError("分析失败")
+    sync_metrics_store(file_path, result)
+    progress(1, 1, os.path.basename(file_path))
+    return result
+
+
+@app.route("/analyze/jobs", methods=["POST"])
+def submit_analyze():
+    """提交单个文件的后台分析任务, 立即返回任务id"""
+    file_name = request.form.get("file")
+    if not file_name:
+        return jsonify({"error": "未选择文件"}), 400
+
+    try:
+        job = submit_analyze_job(file_name)
+    except OSError:
+        return jsonify({"error": "文件不存在"}), 404
+    return _job_accepted(job)
+
+
+def submit_analyze_job(file_name, func=None):
+    """提交单个文件的后台分析任务, 文件未变化时复用已有任务
+
+    func为任务函数, 默认为_analyze_job。
+    """
+    file_path = os.path.join(DATA_DIR, file_name)
+    file_state = MetricsStore.file_state(file_path)
+    key = _job_key("analyze", {"file": file_name, "state": file_state})
+    job, _ = job_manager.submit("analyze", key, func or _analyze_job, file_path)
+    return job
+
+
+def _analyze_upload_job(file_path, progress):
+    """分析新上传的记录, 分析失败时删除该文件, 不留在数据目录中"""
+    try:
+        return _analyze_job(file_path, progress)
+    except Exception:
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+        raise
+
+
+def find_duplicate_upload(file_name, content_sha256):
+    """与已上传或已分析记录重复时返回该记录的文件名, 否则返回None
+
+    file_name为按上传内容哈希命名的文件名, content_sha256为保存后CSV文件的哈希。
+    """
+    if os.path.exists(os.path.join(DATA_DIR, file_name)):
+        return file_name
+    file_name = metrics_store.find_by_digest(content_sha256)
+    if file_name and os.path.exists(os.path.join(DATA_DIR, file_name)):
+        return file_name
+    return None
+
+
+def _binary_upload_header():
+    """由查询参数生成二进制上传的头信息, 参数缺失或不合法时抛出ValueError
+
+    取值写入CSV头的一行, 含换行或逗号的值会伪造或截断头信息行, 直接拒绝。
+    """
+    sampling_rate = request.args.get("sampling_rate", type=float)
+    if not sampling_rate or not np.isfinite(sampling_rate) or sampling_rate <= 0:
+        raise ValueError("二进制上传需要提供采样率")
+
+    record_date = request.args.get("record_date")
+    if record_date:
+        try:
+            datetime.strptime(record_date, UPLOAD_DATE_FORMAT)
+        except ValueError:
+            raise ValueError("record_date格式应为YYYY-MM-DD HH:MM:SS +HHMM") from None
+    else:
+        record_date = datetime.now().astimezone().strftime(UPLOAD_DATE_FORMAT)
+
+    classification = request.args.get("classification", "Unknown")
+    if any(c in classification for c in "\r\n,"):
+        raise ValueError("classification不能包含换行或逗号")
+
+    return {
+        "记录日期": record_date,
+        "分类": classification,
+        "采样率": f"{sampling_rate:g}赫兹",
+        "单位": "µV",
+    }
+
+
+@app.route("/upload", methods=["POST"])
+def upload():
+    """上传ECG记录并提交分析任务
+
+    请求体为Apple Watch导出格式的CSV(text/csv), 或小端float32采样
+    (application/octet-stream, 查询参数sampling_rate必填, record_date、classification可选,
+    record_date格式为UPLOAD_DATE_FORMAT, 参数不合法时返回400),
+    支持分块传输。请求体边接收边解析到预分配的缓冲区, 同时写入数据目录下的临时文件,
+    接收完成后保存为以内容哈希命名的CSV, 解析结果直接作为侧车文件, 分析时不再解析文本。
+    内容与已上传或已分析的记录相同时不再保存, 直接提交该记录的分析任务(命中缓存)。
+    短于UPLOAD_MIN_SECONDS的记录直接拒绝; 保存后分析失败的记录会从数据目录中删除。
+    """
+    content_length = request.content_length
+    if content_length is not None and content_length > UPLOAD_MAX_BYTES:
+        return jsonify({"error": "上传内容过大"}), 413
+
+    binary = request.mimetype == "application/octet-stream"
+    if binary:
+        try:
+            header = _binary_upload_header()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        parser = BinaryStreamParser(header, content_length)
+    else:
+        parser = CSVStreamParser(content_length)
+
+    fd, tmp_path = tempfile.mkstemp(dir=DATA_DIR, suffix=".upload.tmp")
+    try:
+        with os.fdopen(fd, "wb") as spool:
+            # 二进制上传在接收完成后转换为CSV, 接收时不需要保存原始内容
+            header, samples, upload_sha256 = receive_upload(
+                request.stream,
+                parser,
+                spool=None if binary else spool,
+                max_bytes=UPLOAD_MAX_BYTES,
+            )
+            fs = parse_sampling_rate(header) or analyzer.sampling_rate
+            if len(samples) < UPLOAD_MIN_SECONDS * fs:
+                raise ValueError(f"记录过短, 至少需要{UPLOAD_MIN_SECONDS}秒")
+            if binary:
+                write_ecg_csv(spool, header, samples)
+        # 文件名取自上传内容的哈希; 二进制上传转换后的CSV另有哈希, 用于和已分析记录比较
+        upload_name = f"{UPLOAD_PREFIX}{upload_sha256[:16]}.csv"
+        content_sha256 = file_sha256(tmp_path) if binary else upload_sha256
+
+        file_name = find_duplicate_upload(upload_name, content_sha256)
+        duplicate = file_name is not None
+        if not duplicate:
+            file_name = upload_name
+            file_path = os.path.join(DATA_DIR, file_name)
+            os.replace(tmp_path, file_path)
+            try:
+                write_sidecar(file_path, analyzer.sidecar_dir, header, samples)
+            except OSError as e:
+                print(f"写入侧车文件 {file_path} 时出错: {str(e)}")
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": f"无法解析上传内容: {str(e)}"}), 400
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    # 新保存的记录分析失败时会被删除; 重复的记录已分析过, 按普通任务提交
+    job = submit_analyze_job(
+        file_name, func=None if duplicate else _analyze_upload_job
+    )
+    return _job_accepted(job, file=file_name, duplicate=duplicate)
+
+
+@app.route("/compare/jobs", methods=["POST"])
+def submit_compare():
+    """提交比较分析的后台任务, 立即返回任务id"""
+    return _job_accepted(submit_compare_job())
+
+
+def _job_accepted(job, **extra):
+    response = jsonify(
+        {**job.to_dict(), "status_url": url_for("job_status", job_id=job.id), **extra}
+    )
+    return response, 202
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    """查询后台任务的状态和进度, 完成后附带结果"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在"}), 404
+
+    data = job.to_dict()
+    if job.status == Job.DONE:
+        if job.kind == "analyze":
+            data["result"] = format_analysis(job.result)
+        else:
+            data["result"] = {
+                "plot_url": url_for("plot_file", name=comparison_plot_name(job)),
+                "stats": job.result[2],
+            }
+    return jsonify(data)
+
+
 @app.route("/compare")
 def compare():
-    """比较分析页面"""
-    all_results, comparison_plot, stats = analyze_all_files()
+    """比较分析页面
+
+    与/compare/jobs共用同一个后台任务, 并发的请求只计算一次。
+    请求线程不等待任务: 任务未完成时返回轮询任务状态的等待页面。
+    """
+    job = submit_compare_job()
+    if job.status == Job.FAILED:
+        return jsonify({"error": job.error}), 500
+    if job.status != Job.DONE:
+        # 任务未完成时立即返回等待页面, 由页面轮询任务状态, 完成后重新加载
+        return render_template(
+            "compare.html",
+            job=job.to_dict(),
+            status_url=url_for("job_status", job_id=job.id),
+        )
+    plot_name = comparison_plot_name(job)
+    stats = job.result[2]
+    # 详细记录由/compare/records分页加载, 页面大小与记录总数无关
     return render_template(
-        "compare.html", plot=comparison_plot, stats=stats, results=all_results
+        "compare.html",
+        plot_url=url_for("plot_file", name=plot_name),
+        stats=stats,
+        recent_anomalies=stats["anomalies"][-COMPARE_RECENT_ANOMALIES:],
+        classifications=metrics_store.classifications(),
+        health_levels=HEALTH_LEVELS,
+        page_size=COMPARE_PAGE_SIZE,
+    )
+
+
+def _parse_date_arg(name):
+    """读取YYYY-MM-DD格式的日期参数, 缺失时返回None, 格式错误时抛出ValueError"""
+    value = request.args.get(name)
+    return date.fromisoformat(value) if value else None
+
+
+def _record_row(result):
+    """比较页面表格中一行的数据"""
+    health = result.health_evaluation or {}
+    return {
+        "file_name": result.file_name,
+        "record_date": result.record_date,
+        "classification": result.classification,
+        "mean_hr": result.heart_rate_stats["mean_hr"],
+        "sdnn": result.hrv_metrics["sdnn"],
+        "rmssd": result.hrv_metrics["rmssd"],
+        "pnn50": result.hrv_metrics["pnn50"],
+        "lf_hf_ratio": result.hrv_metrics.get("lf_hf_ratio"),
+        "sd1": result.hrv_metrics.get("sd1", 0),
+        "sd2": result.hrv_metrics.get("sd2", 0),
+        "sample_entropy": result.hrv_metrics.get("sample_entropy"),
+        "health_score": health.get("score"),
+        "health_level": health.get("level"),
+        "warnings": result.arrhythmia_warnings,
+        "anomaly": bool(result.anomaly and result.anomaly["flagged"]),
+        "details_url": url_for("compare_record", file_name=result.file_name),
+    }
+
+
+@app.route("/compare/records")
+def compare_records():
+    """分页查询已分析的记录
+
+    查询参数: start、end(YYYY-MM-DD, 含当天), classification, health_level,
+    page(从1开始), per_page(默认50, 最多500)。数据来自指标存储, 只读取当前页。
+    """
+    try:
+        start = _parse_date_arg("start")
+        end = _parse_date_arg("end")
+    except ValueError:
+        return jsonify({"error": "日期格式应为YYYY-MM-DD"}), 400
+    per_page = request.args.get("per_page", COMPARE_PAGE_SIZE, type=int)
+    per_page = min(max(per_page, 1), COMPARE_MAX_PAGE_SIZE)
+    page = max(request.args.get("page", 1, type=int), 1)
+
+    total, results = metrics_store.query(
+        start=start.isoformat() if start else None,
+        # 记录日期带有时间, 上界取下一天的零点
+        end=(end + timedelta(days=1)).isoformat() if end else None,
+        classification=request.args.get("classification") or None,
+        health_level=request.args.get("health_level") or None,
+        limit=per_page,
+        offset=(page - 1) * per_page,
+    )
+    return jsonify(
+        {
+            "total": total,
+            "page": page,
+            "per_page": per_page,
+            "pages": (total + per_page - 1) // per_page,
+            "records": [_record_row(r) for r in results],
+        }
+    )
+
+
+@app.route("/compare/records/<file_name>")
+def compare_record(file_name):
+    """单条记录的详细分析结果, 在比较页面展开时加载"""
+    result = metrics_store.get(file_name)
+    if result is None:
+        return jsonify({"error": "记录不存在"}), 404
+    return jsonify(
+        {**format_analysis(result), "health_evaluation": result.health_evaluation}
+    )
+
+
+@app.route("/plots/<name>")
+def plot_file(name):
+    """提供内容寻址的图像文件, 支持ETag条件请求和长期缓存"""
+    try:
+        path = plot_store.path(name)
+    except ValueError:
+        abort(404)
+    if not os.path.exists(path):
+        abort(404)
+    plot_store.touch(name)
+
+    response = send_file(
+        path,
+        mimetype=PLOT_FORMATS[name.rsplit(".", 1)[1]],
+        etag=PlotStore.etag(name),
+        max_age=PLOT_MAX_AGE,
+        conditional=True,
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@app.route("/signal/<file_name>")
+def signal_view(file_name):
+    """按时间范围和像素宽度返回处理后信号的最小/最大值包络
+
+    查询参数: start、end(秒, 默认整个记录), width(像素, 默认1000),
+    format=json(默认)或f32(小端float32的最小值、最大值交替排列, 元数据在响应头中)。
+    只读取所选层中与请求范围对应的部分, 耗时与像素数成正比, 与记录长度无关。
+    """
+    file_path = os.path.join(DATA_DIR, file_name)
+    if os.path.basename(file_name) != file_name or not os.path.isfile(file_path):
+        abort(404)
+    # 无法解析的参数按未提供处理
+    start = request.args.get("start", type=float)
+    end = request.args.get("end", type=float)
+    width = request.args.get("width", SIGNAL_DEFAULT_WIDTH, type=int)
+    width = min(max(width, 1), SIGNAL_MAX_WIDTH)
+
+    pyramid = analyzer.signal_pyramid(file_path)
+    if pyramid is None:
+        return jsonify({"error": "分析失败"}), 500
+    view = pyramid.query(start, end, width)
+
+    meta = {
+        "level": view["level"],
+        "start": view["start"],
+        "bin_seconds": view["bin_seconds"],
+        "duration": pyramid.n_samples / pyramid.sampling_rate,
+    }
+    if request.args.get("format") == "f32":
+        pairs = np.empty(2 * len(view["min"]), dtype="<f4")
+        pairs[0::2] = view["min"]
+        pairs[1::2] = view["max"]
+        response = app.response_class(
+            pairs.tobytes(), mimetype="application/octet-stream"
+        )
+        for name, value in meta.items():
+            response.headers[f"X-LOD-{name.replace('_', '-').title()}"] = str(value)
+        return response
+    return jsonify(
+        {**meta, "min": view["min"].tolist(), "max": view["max"].tolist()}
     )
 
 
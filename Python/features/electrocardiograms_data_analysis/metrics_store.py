@@ -0,0 +1,231 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import closing
+
+import numpy as np
+
+from analysis_result import AnalysisResult
+
+
+def _to_builtin(value):
+    """把numpy标量/数组转换为可JSON序列化的Python对象"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"无法序列化类型 {type(value).__name__}")
+
+
+class MetricsStore:
+    """每条记录的指标存储(SQLite)
+
+    按文件名保存分析摘要以及分析时文件的mtime/大小和分析参数,
+    只有新增、被修改或分析参数变化的记录需要重新分析。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn, conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS recordings (
+                    file_name TEXT PRIMARY KEY,
+                    mtime_ns INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    params TEXT NOT NULL,
+                    record_date TEXT,
+                    classification TEXT,
+                    mean_hr REAL,
+                    health_score INTEGER,
+                    health_level TEXT,
+                    summary TEXT NOT NULL,
+                    content_sha256 TEXT
+                )
+                """
+            )
+            # 旧版本创建的数据库没有内容哈希列
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(recordings)")}
+            if "content_sha256" not in columns:
+                conn.execute("ALTER TABLE recordings ADD COLUMN content_sha256 TEXT")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_recordings_date "
+                "ON recordings (record_date)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_recordings_sha256 "
+                "ON recordings (content_sha256)"
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS detector_state (
+                    name TEXT PRIMARY KEY,
+                    params TEXT NOT NULL,
+                    state TEXT NOT NULL
+                )
+                """
+            )
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.db_path, timeout=30))
+
+    @staticmethod
+    def file_state(file_path):
+        """文件的(mtime_ns, size), 用于判断文件是否被修改"""
+        stat = os.stat(file_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def stale_files(self, file_states, params):
+        """返回需要(重新)分析的文件名
+
+        file_states: {文件名: (mtime_ns, size)}
+        """
+        params_json = json.dumps(params, sort_keys=True)
+        with self._connect() as conn:
+            known = {
+                row[0]: (row[1], row[2], row[3])
+                for row in conn.execute(
+                    "SELECT file_name, mtime_ns, size, params FROM recordings"
+                )
+            }
+        return [
+            name
+            for name, state in file_states.items()
+            if known.get(name) != (*state, params_json)
+        ]
+
+    def upsert(self, file_name, file_state, params, result, content_sha256=None):
+        """写入或更新一条记录的分析摘要(AnalysisResult)
+
+        content_sha256为文件内容的哈希, 用于识别重复上传的记录。
+        """
+        health = result.health_evaluation or {}
+        row = (
+            file_name,
+            file_state[0],
+            file_state[1],
+            json.dumps(params, sort_keys=True),
+            result.record_date,
+            result.classification,
+            float(result.heart_rate_stats["mean_hr"]),
+            health.get("score"),
+            health.get("level"),
+            json.dumps(result.to_dict(), ensure_ascii=False, default=_to_builtin),
+            content_sha256,
+        )
+        with self._lock, self._connect() as conn, conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO recordings (
+                    file_name, mtime_ns, size, params, record_date,
+                    classification, mean_hr, health_score, health_level, summary,
+                    content_sha256
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                row,
+            )
+
+    def load_state(self, name, params):
+        """读取在线检测器的状态, 不存在或分析参数不同时返回None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT params, state FROM detector_state WHERE name = ?", (name,)
+            ).fetchone()
+        if row is None or row[0] != json.dumps(params, sort_keys=True):
+            return None
+        return json.loads(row[1])
+
+    def save_state(self, name, params, state):
+        """保存在线检测器的状态"""
+        row = (name, json.dumps(params, sort_keys=True), json.dumps(state))
+        with self._lock, self._connect() as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO detector_state (name, params, state) "
+                "VALUES (?, ?, ?)",
+                row,
+            )
+
+    def prune(self, existing_files):
+        """删除已不存在的文件对应的记录"""
+        existing = set(existing_files)
+        with self._lock, self._connect() as conn, conn:
+            names = [row[0] for row in conn.execute("SELECT file_name FROM recordings")]
+            removed = [(name,) for name in names if name not in existing]
+            conn.executemany("DELETE FROM recordings WHERE file_name = ?", removed)
+        return len(removed)
+
+    def get(self, file_name):
+        """读取一条记录的分析摘要, 不存在时返回None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT summary FROM recordings WHERE file_name = ?", (file_name,)
+            ).fetchone()
+        return AnalysisResult.from_dict(json.loads(row[0])) if row else None
+
+    def find_by_digest(self, content_sha256):
+        """内容哈希相同的已分析记录的文件名, 没有时返回None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT file_name FROM recordings WHERE content_sha256 = ? "
+                "ORDER BY file_name LIMIT 1",
+                (content_sha256,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def query(
+        self,
+        start=None,
+        end=None,
+        classification=None,
+        health_level=None,
+        limit=50,
+        offset=0,
+    ):
+        """按条件分页读取记录, 返回(符合条件的总数, 当前页的AnalysisResult列表)
+
+        start为记录日期的下界(含), end为上界(不含), 按字符串比较(例如"2024-01-01");
+        结果按记录日期排序, 只反序列化当前页的摘要。
+        """
+        conditions = []
+        args = []
+        for clause, value in (
+            ("record_date >= ?", start),
+            ("record_date < ?", end),
+            ("classification = ?", classification),
+            ("health_level = ?", health_level),
+        ):
+            if value:
+                conditions.append(clause)
+                args.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self._connect() as conn:
+            total = conn.execute(
+                f"SELECT COUNT(*) FROM recordings {where}", args
+            ).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT summary FROM recordings {where} "
+                "ORDER BY record_date, file_name LIMIT ? OFFSET ?",
+                [*args, limit, offset],
+            ).fetchall()
+        return total, [AnalysisResult.from_dict(json.loads(row[0])) for row in rows]
+
+    def classifications(self):
+        """所有记录中出现过的分类"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT DISTINCT classification FROM recordings "
+                "WHERE classification IS NOT NULL ORDER BY classification"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def load_all(self):
+        """按记录日期读取所有记录的分析摘要, 返回AnalysisResult列表"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT summary FROM recordings ORDER BY record_date, file_name"
+            ).fetchall()
+        return [AnalysisResult.from_dict(json.loads(row[0])) for row in rows]
@@ -0,0 +1,63 @@
+import hashlib
+import json
+
+import numpy as np
+
+from result_cache import ResultCache
+
+
+def extends(previous, data):
+    """data是否是previous在末尾追加若干行(或元素)后的结果"""
+    previous = np.asarray(previous)
+    data = np.asarray(data)
+    return (
+        previous.shape[1:] == data.shape[1:]
+        and len(previous) < len(data)
+        and np.array_equal(data[: len(previous)], previous)
+    )
+
+
+class ModelStore:
+    """拟合模型的磁盘存储
+
+    条目按模型类型、参数和输入数据的哈希保存, 输入不变时直接取回上次的输出;
+    每种模型另外记录最近一次拟合的输入和模型, 新输入是它的延长时用于热启动。
+    存储和淘汰由ResultCache负责。
+    """
+
+    def __init__(self, model_dir, max_entries=64):
+        self._cache = ResultCache(model_dir, max_entries=max_entries)
+
+    @staticmethod
+    def key_for(kind, data, params=None):
+        """由模型类型、参数和输入数据生成键"""
+        data = np.ascontiguousarray(data, dtype=np.float64)
+        header = json.dumps(
+            {"kind": kind, "params": params, "shape": data.shape},
+            sort_keys=True,
+            default=str,
+        )
+        sha = hashlib.sha256(header.encode("utf-8"))
+        sha.update(data.tobytes())
+        return sha.hexdigest()
+
+    @staticmethod
+    def _latest_key(kind):
+        return hashlib.sha256(f"latest:{kind}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """读取条目{data, model, output}, 未命中时返回None"""
+        return self._cache.get(key)
+
+    def latest(self, kind):
+        """该类型最近一次拟合的条目, 没有时返回None"""
+        return self._cache.get(self._latest_key(kind))
+
+    def put(self, key, kind, data, model, output):
+        """保存拟合结果, 同时记为该类型的最近一次拟合"""
+        entry = {"data": np.asarray(data, dtype=np.float64), "model": model, "output": output}
+        self._cache.put(key, entry)
+        self._cache.put(self._latest_key(kind), entry)
+
+    def clear(self):
+        self._cache.clear()
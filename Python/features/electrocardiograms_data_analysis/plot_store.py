@@ -0,0 +1,86 @@
+import hashlib
+import os
+import re
+import threading
+
+# 内容寻址的文件名: sha256 + 扩展名
+PLOT_NAME_PATTERN = re.compile(r"^[0-9a-f]{64}\.(png|webp|svg)$")
+
+
+class PlotStore:
+    """按内容哈希命名的图像文件存储
+
+    相同内容只保存一份, 文件一经写入不再改变, 可以被浏览器和代理长期缓存。
+    文件数或总字节数超出上限时按最近访问时间(LRU)删除, 与ResultCache的淘汰方式相同;
+    结果引用的图像被删除后由main在返回图像地址前重新绘制。
+    """
+
+    def __init__(self, plot_dir, max_files=1024, max_bytes=256 * 1024 * 1024):
+        self.plot_dir = plot_dir
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(plot_dir, exist_ok=True)
+
+    def save(self, img_bytes, plot_format):
+        """保存图像, 返回内容寻址的文件名"""
+        name = f"{hashlib.sha256(img_bytes).hexdigest()}.{plot_format}"
+        path = self.path(name)
+        if os.path.exists(path):
+            self.touch(name)
+            return name
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(img_bytes)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._evict()
+        return name
+
+    def touch(self, name):
+        """更新访问时间, 供LRU淘汰使用"""
+        try:
+            os.utime(self.path(name))
+        except (OSError, ValueError):
+            pass
+
+    def _evict(self):
+        """按访问时间从旧到新删除, 直到满足文件数和容量限制"""
+        files = []
+        for entry in os.scandir(self.plot_dir):
+            if not PLOT_NAME_PATTERN.match(entry.name):
+                continue
+            # 其他进程可能同时在删除文件
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, entry.path, stat.st_size))
+
+        files.sort()
+        total_bytes = sum(size for _, _, size in files)
+        while files and (len(files) > self.max_files or total_bytes > self.max_bytes):
+            _, path, size = files.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total_bytes -= size
+
+    def path(self, name):
+        """文件名对应的磁盘路径, 文件名不合法时抛出ValueError"""
+        if not PLOT_NAME_PATTERN.match(name):
+            raise ValueError(f"非法的图像文件名: {name}")
+        return os.path.join(self.plot_dir, name)
+
+    def exists(self, name):
+        try:
+            return os.path.exists(self.path(name))
+        except ValueError:
+            return False
+
+    @staticmethod
+    def etag(name):
+        """文件名即内容哈希, 直接作为ETag"""
+        return name.split(".", 1)[0]
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+
+
+class ResultCache:
+    """分析结果的磁盘缓存
+
+    缓存键由文件内容哈希和分析参数共同决定, 文件内容或参数变化后自动失效;
+    条目数或总字节数超出上限时按最近访问时间(LRU)淘汰。
+    每个条目可以附带同名的数组文件(扩展名由attachment_suffixes指定), 与条目一起淘汰。
+    """
+
+    def __init__(
+        self,
+        cache_dir,
+        max_entries=256,
+        max_bytes=512 * 1024 * 1024,
+        attachment_suffixes=(".npz",),
+    ):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.attachment_suffixes = tuple(attachment_suffixes)
+        self._lock = threading.Lock()
+        # 文件路径 -> (mtime_ns, size, sha256), 避免重复计算未修改文件的哈希
+        self._digests = {}
+        # (文件路径, 命名空间) -> 最近一次写入的键, 文件变化时删除旧条目
+        self._latest = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def file_digest(self, file_path):
+        """计算文件内容的SHA-256, 文件未修改时直接复用"""
+        stat = os.stat(file_path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        cached = self._digests.get(file_path)
+        if cached and cached[:2] == stamp:
+            return cached[2]
+
+        sha = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        digest = sha.hexdigest()
+        self._digests[file_path] = (*stamp, digest)
+        return digest
+
+    def key_for(self, file_path, namespace, params):
+        """由文件内容哈希、命名空间和分析参数生成缓存键"""
+        payload = json.dumps(
+            {
+                "file": self.file_digest(file_path),
+                "namespace": namespace,
+                "params": params,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def array_path(self, key, suffix=".npz"):
+        """条目附带的数组文件路径"""
+        if suffix not in self.attachment_suffixes:
+            raise ValueError(f"未登记的附带文件扩展名: {suffix}")
+        return os.path.join(self.cache_dir, f"{key}{suffix}")
+
+    def get(self, key):
+        """读取缓存, 未命中时返回None"""
+        path = self._entry_path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        # 更新访问时间, 供LRU淘汰使用
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value, file_path=None, namespace=None):
+        """写入缓存, 同一文件的旧条目会被替换"""
+        path = self._entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if file_path is not None:
+                previous = self._latest.get((file_path, namespace))
+                if previous and previous != key:
+                    self._remove(previous)
+                self._latest[(file_path, namespace)] = key
+            self._evict()
+
+    def _remove(self, key):
+        paths = [self._entry_path(key)]
+        paths += [self.array_path(key, suffix) for suffix in self.attachment_suffixes]
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _evict(self):
+        """按访问时间从旧到新淘汰, 直到满足条目数和容量限制"""
+        access_times = {}
+        sizes = {}
+        for entry in os.scandir(self.cache_dir):
+            key, dot, suffix = entry.name.partition(".")
+            suffix = dot + suffix
+            if suffix != ".pkl" and suffix not in self.attachment_suffixes:
+                continue
+            # 其他进程可能同时在淘汰条目
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            sizes[key] = sizes.get(key, 0) + stat.st_size
+            if suffix == ".pkl":
+                access_times[key] = stat.st_mtime
+
+        # 没有对应.pkl的附带文件属于正在写入或已淘汰的条目, 不计入条目数
+        entries = sorted((t, key) for key, t in access_times.items())
+        total_bytes = sum(sizes.values())
+        while entries and (
+            len(entries) > self.max_entries or total_bytes > self.max_bytes
+        ):
+            _, key = entries.pop(0)
+            self._remove(key)
+            total_bytes -= sizes[key]
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            suffixes = (".pkl", *self.attachment_suffixes)
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith(suffixes):
+                    os.remove(entry.path)
+            self._latest.clear()
@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+
+def minmax_indices(y, n_bins):
+    """最小/最大值包络抽取, 返回保留样本的索引
+
+    把信号均分为n_bins个区间, 每个区间按时间顺序保留最小值和最大值两个样本,
+    绘制到n_bins像素宽时与完整信号的外观一致。信号足够短时返回全部索引。
+    """
+    n = len(y)
+    if n_bins <= 0 or n <= 2 * n_bins:
+        return np.arange(n)
+
+    bin_size = -(-n // n_bins)  # 向上取整
+    n_full = n // bin_size
+    body = np.asarray(y[: n_full * bin_size]).reshape(n_full, bin_size)
+    starts = np.arange(n_full) * bin_size
+    lo = body.argmin(axis=1)
+    hi = body.argmax(axis=1)
+
+    indices = np.empty(2 * n_full, dtype=np.int64)
+    indices[0::2] = starts + np.minimum(lo, hi)
+    indices[1::2] = starts + np.maximum(lo, hi)
+
+    # 不足一个区间的尾部单独处理
+    if n_full * bin_size < n:
+        tail = np.asarray(y[n_full * bin_size :])
+        tail_start = n_full * bin_size
+        pair = sorted({int(tail.argmin()), int(tail.argmax())})
+        indices = np.concatenate((indices, tail_start + np.asarray(pair)))
+    return indices
+
+
+def _reduce_pairs(lo, hi, factor):
+    """把相邻factor个区间合并为一个, 返回合并后的(最小值, 最大值)
+
+    不足factor个的尾部用最后一个值补齐, 不影响最小/最大值。
+    """
+    pad = -len(lo) % factor
+    if pad:
+        lo = np.concatenate((lo, np.repeat(lo[-1:], pad)))
+        hi = np.concatenate((hi, np.repeat(hi[-1:], pad)))
+    return lo.reshape(-1, factor).min(axis=1), hi.reshape(-1, factor).max(axis=1)
+
+
+class SignalPyramid:
+    """最小/最大值多分辨率金字塔, 用于任意缩放和平移的信号浏览
+
+    第0层是原始采样点, 第k层每个区间覆盖factor**k个采样点并保存区间内的
+    最小值和最大值, 直到区间数不超过min_bins。所有层拼接为一个一维float32数组
+    (第k层按最小值、最大值交替存放), 保存为.npy后可以内存映射,
+    每次查询只读取与像素数成正比的数据。
+    """
+
+    def __init__(self, data, n_samples, sampling_rate, factor, offsets):
+        self.data = data
+        self.n_samples = n_samples
+        self.sampling_rate = sampling_rate
+        self.factor = factor
+        self.offsets = offsets  # 每层在data中的起始位置, 最后一个元素为总长度
+
+    @property
+    def n_levels(self):
+        return len(self.offsets) - 1
+
+    @classmethod
+    def build(cls, y, sampling_rate, factor=4, min_bins=256):
+        """由信号构建金字塔, 总计算量为O(n)"""
+        y = np.asarray(y, dtype=np.float32)
+        parts = [y]
+        lo = hi = y
+        while len(lo) > min_bins:
+            lo, hi = _reduce_pairs(lo, hi, factor)
+            pairs = np.empty(2 * len(lo), dtype=np.float32)
+            pairs[0::2] = lo
+            pairs[1::2] = hi
+            parts.append(pairs)
+        offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in parts], out=offsets[1:])
+        return cls(
+            np.concatenate(parts), len(y), float(sampling_rate), factor, offsets.tolist()
+        )
+
+    def save(self, path):
+        """保存为path(.npy数组)和meta_path(path)(元数据), 先写临时文件再替换"""
+        # 临时文件名包含进程和线程编号, 同一金字塔的并发写入互不干扰
+        tmp_suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp_path = f"{path}.{tmp_suffix}"
+        with open(tmp_path, "wb") as f:
+            np.save(f, self.data)
+        meta = {
+            "n_samples": self.n_samples,
+            "sampling_rate": self.sampling_rate,
+            "factor": self.factor,
+            "offsets": self.offsets,
+        }
+        meta_path = self.meta_path(path)
+        meta_tmp_path = f"{meta_path}.{tmp_suffix}"
+        with open(meta_tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(meta_tmp_path, meta_path)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def meta_path(path):
+        """元数据文件路径: x.lod.npy -> x.lod.json"""
+        return f"{os.path.splitext(path)[0]}.json"
+
+    @classmethod
+    def open(cls, path):
+        """内存映射方式打开已保存的金字塔"""
+        with open(cls.meta_path(path), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        data = np.load(path, mmap_mode="r")
+        if len(data) != meta["offsets"][-1]:
+            raise ValueError(f"金字塔文件不完整: {path}")
+        return cls(
+            data, meta["n_samples"], meta["sampling_rate"], meta["factor"], meta["offsets"]
+        )
+
+    def query(self, start=None, end=None, width=1000):
+        """返回覆盖[start, end)秒、适合width像素显示的一层数据
+
+        选择区间数不少于width的最粗一层, 返回的区间数不超过factor * width + 2。
+        结果: level, start(第一个区间的起始时间), bin_seconds, min, max;
+        第0层的min和max都是原始采样值。
+        """
+        fs = self.sampling_rate
+        i0 = 0 if start is None else int(np.clip(np.floor(start * fs), 0, self.n_samples))
+        i1 = (
+            self.n_samples
+            if end is None
+            else int(np.clip(np.ceil(end * fs), i0, self.n_samples))
+        )
+        samples_per_pixel = (i1 - i0) / max(int(width), 1)
+
+        level = 0
+        while level + 1 < self.n_levels and self.factor ** (level + 1) <= samples_per_pixel:
+            level += 1
+
+        bin_size = self.factor**level
+        b0 = i0 // bin_size
+        b1 = -(-i1 // bin_size)
+        base = self.offsets[level]
+        if level == 0:
+            values = np.asarray(self.data[base + b0 : base + b1])
+            lo = hi = values
+        else:
+            pairs = np.asarray(self.data[base + 2 * b0 : base + 2 * b1])
+            lo, hi = pairs[0::2], pairs[1::2]
+        return {
+            "level": level,
+            "start": b0 * bin_size / fs,
+            "bin_seconds": bin_size / fs,
+            "min": lo,
+            "max": hi,
+        }
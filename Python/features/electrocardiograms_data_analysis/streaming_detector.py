@@ -0,0 +1,154 @@
+import numpy as np
+from scipy import signal
+
+from ecg_filters import butter_sos
+
+
+class StreamingPeakDetector:
+    """流式R峰检测(Pan-Tompkins)
+
+    按块输入采样数据, 滤波器状态在块之间保持(sosfilt/lfilter的zi),
+    阈值随信号峰/噪声峰自适应更新。每个R峰最多延迟约0.2秒
+    (不应期长度)加一个块的时间被确认, 内部缓冲区大小与记录总长度无关。
+    """
+
+    def __init__(self, sampling_rate, learning_seconds=2.0):
+        fs = float(sampling_rate)
+        self.sampling_rate = fs
+        self._sos = butter_sos(3, (5.0, 15.0), fs, "bandpass")
+        self._window = max(1, int(0.1 * fs))  # 移动积分窗口
+        self._kernel = np.ones(self._window) / self._window
+        self._refractory = int(0.2 * fs)  # 不应期, 两个R峰的最小间隔
+        self._learning = int(learning_seconds * fs)  # 初始化阈值所需的样本数
+
+        # 带通滤波器在通带中心的群延迟, 用于把R峰位置对齐到原始信号
+        b, a = signal.sos2tf(self._sos)
+        _, gd = signal.group_delay((b, a), w=[10.0], fs=fs)
+        self._group_delay = int(round(gd[0]))
+
+        self.reset()
+
+    def reset(self):
+        """清空所有状态, 开始新的记录"""
+        self._bp_zi = None
+        self._mwi_zi = np.zeros(self._window - 1)
+        self._last_filtered = None
+
+        # 尚未丢弃的带通信号和积分信号, _offset为缓冲区首个样本的全局索引
+        self._filtered = np.empty(0)
+        self._integrated = np.empty(0)
+        self._offset = 0
+        self._next = 0  # 尚未判定的第一个全局索引
+
+        self._spki = None  # 信号峰估计
+        self._npki = None  # 噪声峰估计
+        self._last_peak = -self._refractory
+        self.n_samples = 0
+
+    @property
+    def threshold(self):
+        """当前检测阈值, 阈值尚未初始化时为None"""
+        if self._spki is None:
+            return None
+        return self._npki + 0.25 * (self._spki - self._npki)
+
+    def process(self, chunk):
+        """输入一块采样数据, 返回本次确认的R峰(全局采样索引)"""
+        x = np.asarray(chunk, dtype=np.float64)
+        if len(x) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        # 1. 带通滤波(因果), 首块用初值消除启动瞬态
+        if self._bp_zi is None:
+            self._bp_zi = signal.sosfilt_zi(self._sos) * x[0]
+        filtered, self._bp_zi = signal.sosfilt(self._sos, x, zi=self._bp_zi)
+
+        # 2. 求导并平方, 衔接上一块的最后一个样本
+        previous = filtered[0] if self._last_filtered is None else self._last_filtered
+        diff = np.diff(filtered, prepend=previous)
+        self._last_filtered = filtered[-1]
+
+        # 3. 移动窗口积分
+        integrated, self._mwi_zi = signal.lfilter(
+            self._kernel, 1.0, diff * diff, zi=self._mwi_zi
+        )
+
+        self._filtered = np.concatenate((self._filtered, filtered))
+        self._integrated = np.concatenate((self._integrated, integrated))
+        self.n_samples += len(x)
+
+        # 4. 学习阶段: 用最初几秒的信号初始化阈值
+        if self._spki is None:
+            if len(self._integrated) < self._learning:
+                return np.empty(0, dtype=np.int64)
+            self._spki = 0.25 * np.max(self._integrated)
+            self._npki = 0.5 * np.mean(self._integrated)
+
+        return self._detect(final=False)
+
+    def flush(self):
+        """输入结束, 判定缓冲区中剩余的候选峰"""
+        if self._spki is None and len(self._integrated) > 0:
+            self._spki = 0.25 * np.max(self._integrated)
+            self._npki = 0.5 * np.mean(self._integrated)
+        if self._spki is None:
+            return np.empty(0, dtype=np.int64)
+        return self._detect(final=True)
+
+    def _detect(self, final):
+        end = self._offset + len(self._integrated)
+        # 候选峰之后需要一个不应期的样本才能确定局部最大值
+        limit = end if final else end - self._refractory
+        if limit <= self._next:
+            return np.empty(0, dtype=np.int64)
+
+        candidates, _ = signal.find_peaks(self._integrated)
+        candidates = candidates + self._offset
+        candidates = candidates[(candidates >= self._next) & (candidates < limit)]
+
+        peaks = []
+        for idx in candidates:
+            if idx - self._last_peak < self._refractory:
+                continue
+            local = idx - self._offset
+            value = self._integrated[local]
+            if value > self.threshold:
+                # 取不应期内积分信号的最高点作为该QRS波的位置
+                span = self._integrated[local : local + self._refractory]
+                idx = idx + int(np.argmax(span))
+                value = self._integrated[idx - self._offset]
+                peaks.append(self._locate_r(idx))
+                self._last_peak = idx
+                self._spki = 0.125 * value + 0.875 * self._spki
+            else:
+                self._npki = 0.125 * value + 0.875 * self._npki
+        self._next = max(limit, self._last_peak + 1)
+
+        # 丢弃已判定的样本, 保留回溯R峰位置和局部最大值比较所需的部分
+        keep_from = max(self._offset, limit - self._window - self._group_delay - 1)
+        cut = keep_from - self._offset
+        self._filtered = self._filtered[cut:]
+        self._integrated = self._integrated[cut:]
+        self._offset = keep_from
+
+        return np.asarray(peaks, dtype=np.int64)
+
+    def _locate_r(self, integrated_idx):
+        """在积分峰之前的一个积分窗口内寻找带通信号绝对值最大处, 作为R峰位置"""
+        start = max(self._offset, integrated_idx - self._window)
+        stop = integrated_idx + 1
+        segment = np.abs(self._filtered[start - self._offset : stop - self._offset])
+        r_idx = start + int(np.argmax(segment)) - self._group_delay
+        return max(r_idx, 0)
+
+
+def stream_peaks(chunks, sampling_rate):
+    """对可迭代的数据块逐块检测, 依次产出每块确认的R峰"""
+    detector = StreamingPeakDetector(sampling_rate)
+    for chunk in chunks:
+        peaks = detector.process(chunk)
+        if len(peaks):
+            yield peaks
+    peaks = detector.flush()
+    if len(peaks):
+        yield peaks